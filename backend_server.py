@@ -1,14 +1,30 @@
-from flask import Flask, request, jsonify
+import time
+# 记录模块开始导入的时间，用于启动耗时报告
+_import_started = time.perf_counter()
+
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
 import os
 import sys
 import json
 from pathlib import Path
 import chardet
+import codecs
+import base64
+import bisect
+import mmap
 import logging
 import traceback
 import threading
-import time
+import uuid
+import importlib
+import contextlib
+import hashlib
+import gzip
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict
 from datetime import datetime
 
 # 配置日志
@@ -21,11 +37,51 @@ sys.path.insert(0, str(submodule_path))
 
 # 导入submodule中的功能
 from config import spark_api_key, silicon_api_key, openai_api_key, glm_api_key, APPID, APISecret, APIKEY, model_name, model_provider
-from qg.graph_class import KnowledgeGraph, KnowledgeQuestionGenerator
-from sider.annotator_simple import SimplifiedAnnotator
-from pre_process.text_recognize.processtext import process_input
 
-# 全局进度状态
+# 启动耗时报告：模块自身的导入耗时和各个按需导入模块的耗时
+import_report = {
+    'backend_import_seconds': None,
+    'lazy_imports': {}
+}
+
+class LazySparkLearn:
+    """按需导入SparkLearn中依赖较重的模块
+
+    qg.graph_class、sider.annotator_simple、pre_process.text_recognize.processtext
+    会拉起networkx、OpenCV、PyMuPDF、transformers等依赖，只在第一次用到时才导入，
+    这样像/api/listDirectory这样的接口不必等待它们加载。
+    """
+    _attributes = {
+        'KnowledgeGraph': 'qg.graph_class',
+        'KnowledgeQuestionGenerator': 'qg.graph_class',
+        'SimplifiedAnnotator': 'sider.annotator_simple',
+        'process_input': 'pre_process.text_recognize.processtext',
+    }
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+    
+    def __getattr__(self, name):
+        module_name = self._attributes.get(name)
+        if module_name is None:
+            raise AttributeError(name)
+        with self._lock:
+            if module_name not in sys.modules:
+                start = time.perf_counter()
+                importlib.import_module(module_name)
+                elapsed = round(time.perf_counter() - start, 3)
+                import_report['lazy_imports'][module_name] = elapsed
+                logger.info(f"按需导入 {module_name} 耗时 {elapsed:.2f}秒")
+                # 这些模块会导入OpenAI/智谱SDK，导入后再挂载LLM缓存钩子
+                install_llm_cache_hooks()
+            value = getattr(sys.modules[module_name], name)
+            # 缓存到实例上，之后的访问不再经过__getattr__
+            setattr(self, name, value)
+            return value
+
+sparklearn = LazySparkLearn()
+
+# 全局进度状态（最近一次更新，供旧版/api/getProgress使用）
 progress_state = {
     'current_step': '',
     'percentage': 0,
@@ -33,34 +89,88 @@ progress_state = {
     'timestamp': None
 }
 
-def update_progress(step, percentage, message=""):
-    """更新进度状态"""
+class ProgressChannel:
+    """单个任务的进度通道，内容变化时唤醒等待中的订阅者"""
+    def __init__(self):
+        self.state = {
+            'current_step': '',
+            'percentage': 0,
+            'message': '',
+            'status': 'queued',
+            'timestamp': datetime.now().isoformat()
+        }
+        self.version = 0
+        self.closed = False
+        self._cond = threading.Condition()
+    
+    def publish(self, **fields):
+        """更新进度，内容没有变化时不通知订阅者"""
+        with self._cond:
+            if all(self.state.get(k) == v for k, v in fields.items()):
+                return
+            self.state.update(fields)
+            self.state['timestamp'] = datetime.now().isoformat()
+            self.version += 1
+            self._cond.notify_all()
+    
+    def close(self, status):
+        """任务结束，通知所有订阅者"""
+        with self._cond:
+            self.state['status'] = status
+            self.state['timestamp'] = datetime.now().isoformat()
+            self.version += 1
+            self.closed = True
+            self._cond.notify_all()
+    
+    def snapshot(self):
+        with self._cond:
+            return self.version, dict(self.state), self.closed
+    
+    def wait_for_change(self, last_version, timeout):
+        """阻塞直到版本号变化、通道关闭或超时，返回(version, state, closed)"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.version != last_version or self.closed, timeout)
+            return self.version, dict(self.state), self.closed
+
+# worker进程中设置为转发队列，进度交给服务进程发布
+_worker_progress_queue = None
+
+# 按任务ID存储的进度通道
+progress_channels = {}
+progress_channels_lock = threading.Lock()
+
+def get_progress_channel(job_id, create=False):
+    """获取任务的进度通道"""
+    with progress_channels_lock:
+        channel = progress_channels.get(job_id)
+        if channel is None and create:
+            channel = progress_channels[job_id] = ProgressChannel()
+        return channel
+
+def update_progress(step, percentage, message="", job_id=None):
+    """更新进度状态，指定job_id时同时写入该任务的进度通道"""
     global progress_state
+    if _worker_progress_queue is not None:
+        _worker_progress_queue.put((step, percentage, message, job_id))
+        return
     progress_state.update({
         'current_step': step,
         'percentage': percentage,
         'message': message,
         'timestamp': datetime.now().isoformat()
     })
+    if job_id:
+        channel = get_progress_channel(job_id)
+        if channel:
+            channel.publish(current_step=step, percentage=percentage, message=message)
     print(f"进度更新: {step} - {percentage}% - {message}")
 
 
 
 app = Flask(__name__)
 CORS(app)
-CORS(app, resources={r"/*": {"methods": ["GET", "POST", "OPTIONS"]}})
-
-# 配置Flask日志，过滤掉进度请求
-class ProgressFilter(logging.Filter):
-    def filter(self, record):
-        # 过滤掉进度请求的日志
-        if hasattr(record, 'msg') and '/api/getProgress' in str(record.msg):
-            return False
-        return True
-
-# 应用过滤器到werkzeug日志
-werkzeug_logger = logging.getLogger('werkzeug')
-werkzeug_logger.addFilter(ProgressFilter())
+CORS(app, resources={r"/*": {"methods": ["GET", "POST", "OPTIONS"]}}, expose_headers=['ETag'])
+
 # 全局变量存储配置
 api_config = {
     'spark_api_key': spark_api_key,
@@ -78,9 +188,232 @@ model_config = {
     'model_name': model_name
 }
 
+# ==================== 运行指标 ====================
+# 直方图的分桶上限（秒）
+METRICS_REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+METRICS_LLM_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+METRICS_STAGE_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+
+class MetricsRegistry:
+    """进程内的Prometheus风格指标（计数器和直方图），以文本格式导出
+
+    worker进程中记录的指标通过进度队列转发回服务进程汇总，见record_metric。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}  # {name: {'type', 'help', 'buckets', 'series': {labels: value}}}
+    
+    def define(self, name, metric_type, help_text, buckets=None):
+        self._metrics[name] = {'type': metric_type, 'help': help_text, 'buckets': buckets, 'series': {}}
+    
+    def inc(self, name, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._metrics[name]['series']
+            series[key] = series.get(key, 0) + amount
+    
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            metric = self._metrics[name]
+            histogram = metric['series'].get(key)
+            if histogram is None:
+                histogram = metric['series'][key] = {'buckets': [0] * len(metric['buckets']), 'sum': 0.0, 'count': 0}
+            # 分桶计数是累积的：每个上限不小于value的桶都加一
+            for i, bound in enumerate(metric['buckets']):
+                if value <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+    
+    @staticmethod
+    def _format_labels(labels):
+        if not labels:
+            return ''
+        escape = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in labels) + '}'
+    
+    def render(self, extra=()):
+        """导出文本格式；extra为抓取时计算的[(名称, 类型, 说明, [(labels, 值)])]"""
+        lines = []
+        with self._lock:
+            for name, metric in self._metrics.items():
+                lines.append(f"# HELP {name} {metric['help']}")
+                lines.append(f"# TYPE {name} {metric['type']}")
+                for labels, value in metric['series'].items():
+                    if metric['type'] != 'histogram':
+                        lines.append(f"{name}{self._format_labels(labels)} {value}")
+                        continue
+                    for bound, count in zip(metric['buckets'], value['buckets']):
+                        lines.append(f"{name}_bucket{self._format_labels(labels + (('le', bound),))} {count}")
+                    lines.append(f"{name}_bucket{self._format_labels(labels + (('le', '+Inf'),))} {value['count']}")
+                    lines.append(f"{name}_sum{self._format_labels(labels)} {value['sum']}")
+                    lines.append(f"{name}_count{self._format_labels(labels)} {value['count']}")
+        
+        for name, metric_type, help_text, samples in extra:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                lines.append(f"{name}{self._format_labels(tuple(sorted(labels.items())))} {value}")
+        return '\n'.join(lines) + '\n'
+
+metrics = MetricsRegistry()
+metrics.define('sparklearn_http_request_duration_seconds', 'histogram',
+               '接口处理耗时（流式响应只统计到开始返回）', METRICS_REQUEST_BUCKETS)
+metrics.define('sparklearn_http_requests_total', 'counter', '接口请求数')
+metrics.define('sparklearn_pipeline_stage_duration_seconds', 'histogram', '流程各阶段耗时', METRICS_STAGE_BUCKETS)
+metrics.define('sparklearn_llm_request_duration_seconds', 'histogram', '大模型调用耗时（不含缓存命中）', METRICS_LLM_BUCKETS)
+metrics.define('sparklearn_llm_errors_total', 'counter', '大模型调用失败次数，按error_type分类')
+metrics.define('sparklearn_errors_total', 'counter', '经handle_api_error处理的错误数，按error_type分类')
+
+def record_metric(kind, name, value=1, **labels):
+    """记录一次指标（kind为inc或observe）；在worker进程中则转发给服务进程"""
+    if _worker_progress_queue is not None:
+        _worker_progress_queue.put(('metric', kind, name, value, labels))
+        return
+    if kind == 'inc':
+        metrics.inc(name, value, **labels)
+    else:
+        metrics.observe(name, value, **labels)
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def _record_request_metrics(response):
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe('sparklearn_http_request_duration_seconds', time.perf_counter() - started,
+                        route=route, method=request.method)
+        metrics.inc('sparklearn_http_requests_total', route=route, method=request.method,
+                    status=str(response.status_code))
+    return response
+
+# ==================== 性能剖析 ====================
+# 调用栈采样间隔（秒）
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', '0.01'))
+PROFILE_TIMINGS_FILE = 'profile_timings.json'
+# 同一线程上不能同时运行两个cProfile，已有剖析在运行时只做调用栈采样和计时
+_cprofile_lock = threading.Lock()
+_profile_timings_lock = threading.Lock()
+
+class StackSampler(threading.Thread):
+    """定时采样进程内所有线程的调用栈，按折叠栈（collapsed stack）格式计数
+
+    与cProfile不同，采样能看到线程池中的工作线程，以及阻塞在网络I/O上的等待时间。
+    """
+    def __init__(self, interval):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.interval = interval
+        self.counts = {}
+        self._stopped = threading.Event()
+    
+    def run(self):
+        own_ident = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(thread_names.get(ident, str(ident)))
+                key = ';'.join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+    
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+class Profiler:
+    """剖析一段代码：cProfile、调用栈采样和墙钟/CPU计时
+
+    结果写入output_dir（与state.json同目录）：profile_<name>.prof可用pstats或snakeviz查看，
+    profile_<name>.collapsed可直接交给flamegraph.pl或speedscope，耗时汇总在profile_timings.json。
+    """
+    def __init__(self, output_dir, name):
+        self.output_dir = output_dir
+        self.name = name
+        self._profile = None
+        self._sampler = None
+    
+    def start(self):
+        import cProfile
+        if _cprofile_lock.acquire(blocking=False):
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            logger.warning(f"已有剖析在运行，{self.name}只记录调用栈采样")
+        self._sampler = StackSampler(PROFILE_SAMPLE_INTERVAL)
+        self._sampler.start()
+        self._wall_started = time.perf_counter()
+        self._cpu_started = time.process_time()
+        return self
+    
+    def finish(self):
+        wall_seconds = time.perf_counter() - self._wall_started
+        cpu_seconds = time.process_time() - self._cpu_started
+        self._sampler.stop()
+        if self._profile is not None:
+            self._profile.disable()
+            _cprofile_lock.release()
+        
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            if self._profile is not None:
+                self._profile.dump_stats(os.path.join(self.output_dir, f"profile_{self.name}.prof"))
+            with open(os.path.join(self.output_dir, f"profile_{self.name}.collapsed"), 'w', encoding='utf-8') as f:
+                for stack, count in sorted(self._sampler.counts.items()):
+                    f.write(f"{stack} {count}\n")
+            self._write_timing(wall_seconds, cpu_seconds)
+        except OSError as e:
+            logger.warning(f"写入剖析结果失败: {e}")
+        print(f"📈 剖析 {self.name}: 墙钟 {wall_seconds:.2f}秒，CPU {cpu_seconds:.2f}秒")
+    
+    def _write_timing(self, wall_seconds, cpu_seconds):
+        timings_path = os.path.join(self.output_dir, PROFILE_TIMINGS_FILE)
+        with _profile_timings_lock:
+            try:
+                with open(timings_path, 'r', encoding='utf-8') as f:
+                    timings = json.load(f)
+            except (OSError, ValueError):
+                timings = {}
+            timings[self.name] = {
+                'wall_seconds': round(wall_seconds, 3),
+                'cpu_seconds': round(cpu_seconds, 3),
+                'samples': sum(self._sampler.counts.values()),
+                'finished_at': datetime.now().isoformat()
+            }
+            with open(timings_path, 'w', encoding='utf-8') as f:
+                json.dump(timings, f, indent=2, ensure_ascii=False)
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.finish()
+        return False
+
+def profile_section(enabled, output_dir, name):
+    """enabled为False时返回空的上下文管理器，不产生剖析开销"""
+    if enabled and output_dir:
+        return Profiler(output_dir, name)
+    return contextlib.nullcontext()
+
 # 错误处理函数
 def handle_api_error(error, context=""):
-    """处理API相关错误，返回用户友好的错误信息"""
+    """处理API相关错误，返回用户友好的错误信息，并按error_type计数"""
+    error_response = classify_api_error(error)
+    record_metric('inc', 'sparklearn_errors_total', error_type=error_response['error_type'], context=context or 'unknown')
+    return error_response
+
+def classify_api_error(error):
+    """根据错误信息判断错误类型，返回用户友好的错误信息"""
     error_str = str(error)
     
     # 检查是否是认证错误
@@ -320,6 +653,761 @@ def send_config_to_backend():
     
     return jsonify({'success': True, 'message': '配置已更新'})
 
+# ==================== LLM响应缓存 ====================
+# 缓存目录与容量上限（字节），超出上限时按最近访问时间淘汰
+LLM_CACHE_DIR = os.environ.get('LLM_CACHE_DIR', str(Path(__file__).parent / '.cache' / 'llm'))
+LLM_CACHE_MAX_BYTES = int(os.environ.get('LLM_CACHE_MAX_BYTES', str(1024 * 1024 * 1024)))
+LLM_CACHE_ENABLED = os.environ.get('LLM_CACHE_ENABLED', '1') == '1'
+
+class LLMResponseCache:
+    """以内容哈希为键的LLM响应磁盘缓存
+
+    键由提示词、模型名、服务商和调用参数计算得到；每条记录单独存成一个json文件，
+    命中时刷新文件mtime，总大小超过上限时删除mtime最早的记录（LRU）。
+    多个进程共享同一目录时，淘汰顺序依然一致。
+    """
+    def __init__(self, cache_dir, max_bytes, enabled=True):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._index = None  # {key: (size, mtime)}，首次使用时扫描目录建立
+        self._total_bytes = 0
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0, 'errors': 0}
+    
+    @staticmethod
+    def make_key(**parts):
+        """根据调用内容计算缓存键"""
+        payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f'{key}.json'
+    
+    def _ensure_index(self):
+        """扫描缓存目录建立索引（调用方需持有锁）"""
+        if self._index is not None:
+            return
+        self._index = {}
+        self._total_bytes = 0
+        if self.cache_dir.exists():
+            for path in self.cache_dir.glob('*/*.json'):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                self._index[path.stem] = (stat.st_size, stat.st_mtime)
+                self._total_bytes += stat.st_size
+    
+    def get(self, key):
+        """读取缓存，未命中返回None"""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            now = time.time()
+            os.utime(path, (now, now))
+        except FileNotFoundError:
+            with self._lock:
+                self.stats['misses'] += 1
+            return None
+        except (OSError, ValueError):
+            with self._lock:
+                self.stats['misses'] += 1
+                self.stats['errors'] += 1
+            return None
+        
+        with self._lock:
+            self.stats['hits'] += 1
+            if self._index is not None and key in self._index:
+                self._index[key] = (self._index[key][0], now)
+        return entry['value']
+    
+    def set(self, key, value, meta=None):
+        """写入缓存（先写临时文件再替换，避免并发读到半个文件）"""
+        if not self.enabled:
+            return
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            data = json.dumps({'meta': meta or {}, 'value': value}, ensure_ascii=False, default=str)
+            tmp_path = path.with_suffix(f'.{uuid.uuid4().hex}.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            size = path.stat().st_size
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"写入LLM缓存失败: {e}")
+            with self._lock:
+                self.stats['errors'] += 1
+            return
+        
+        with self._lock:
+            self._ensure_index()
+            old_size = self._index.get(key, (0, 0))[0]
+            self._index[key] = (size, time.time())
+            self._total_bytes += size - old_size
+            self.stats['writes'] += 1
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+    
+    def _evict(self):
+        """按mtime从旧到新删除记录，直到总大小降到上限的90%（调用方需持有锁）"""
+        target = int(self.max_bytes * 0.9)
+        for key, (size, mtime) in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if self._total_bytes <= target:
+                break
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+            del self._index[key]
+            self._total_bytes -= size
+            self.stats['evictions'] += 1
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._ensure_index()
+            for key in list(self._index):
+                try:
+                    self._path(key).unlink()
+                except OSError:
+                    pass
+            self._index = {}
+            self._total_bytes = 0
+    
+    def merge_stats(self, delta):
+        """合并worker进程中产生的统计增量
+
+        worker可能写入或淘汰了记录，此时丢弃索引，下次统计时重新扫描目录
+        """
+        with self._lock:
+            for key, value in delta.items():
+                if key in self.stats:
+                    self.stats[key] += value
+            if delta.get('writes') or delta.get('evictions'):
+                self._index = None
+    
+    def get_stats(self):
+        """命中率等统计信息"""
+        with self._lock:
+            self._ensure_index()
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'enabled': self.enabled,
+                'hit_ratio': round(self.stats['hits'] / lookups, 4) if lookups else 0.0,
+                'entries': len(self._index),
+                'total_bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'cache_dir': str(self.cache_dir)
+            }
+
+llm_cache = LLMResponseCache(LLM_CACHE_DIR, LLM_CACHE_MAX_BYTES, enabled=LLM_CACHE_ENABLED)
+
+def _serialize_sdk_response(response):
+    """把SDK返回的pydantic对象转换为可缓存的dict，并记录其类型以便还原"""
+    if hasattr(response, 'model_dump'):
+        data = response.model_dump()
+    elif hasattr(response, 'dict'):
+        data = response.dict()
+    else:
+        return None
+    cls = type(response)
+    return {'module': cls.__module__, 'class': cls.__qualname__, 'data': data}
+
+def _deserialize_sdk_response(cached):
+    """根据缓存记录还原SDK响应对象"""
+    cls = importlib.import_module(cached['module'])
+    for name in cached['class'].split('.'):
+        cls = getattr(cls, name)
+    if hasattr(cls, 'model_validate'):
+        return cls.model_validate(cached['data'])
+    return cls.parse_obj(cached['data'])
+
+def _wrap_completions_create(original, sdk_name):
+    """包装SDK的chat.completions.create，非流式调用先查缓存"""
+    import functools
+    
+    @functools.wraps(original)
+    def create(self, *args, **kwargs):
+        if not llm_cache.enabled or args or kwargs.get('stream'):
+            return original(self, *args, **kwargs)
+        
+        client = getattr(self, '_client', None)
+        key = llm_cache.make_key(
+            sdk=sdk_name,
+            provider=model_config.get('model_provider'),
+            endpoint=str(getattr(client, 'base_url', '')),
+            model=kwargs.get('model'),
+            params={k: v for k, v in kwargs.items() if k not in ('model', 'timeout', 'extra_headers')}
+        )
+        cached = llm_cache.get(key)
+        if cached is not None:
+            try:
+                return _deserialize_sdk_response(cached)
+            except Exception as e:
+                logger.warning(f"还原LLM缓存失败，重新请求: {e}")
+        
+        start = time.perf_counter()
+        try:
+            response = original(self, *args, **kwargs)
+        except Exception as e:
+            record_metric('inc', 'sparklearn_llm_errors_total', source=sdk_name,
+                          error_type=classify_api_error(e)['error_type'])
+            raise
+        record_metric('observe', 'sparklearn_llm_request_duration_seconds', time.perf_counter() - start, source=sdk_name)
+        serialized = _serialize_sdk_response(response)
+        if serialized is not None:
+            llm_cache.set(key, serialized, meta={'sdk': sdk_name, 'model': kwargs.get('model')})
+        return response
+    
+    create._llm_cache_wrapped = True
+    return create
+
+def install_llm_cache_hooks():
+    """为已安装的OpenAI兼容SDK（OpenAI、SiliconFlow）和智谱SDK安装缓存钩子
+
+    星火通过websocket直接调用，没有可挂载的SDK入口，不在此处缓存。
+    SDK导入较慢，钩子在首次用到SparkLearn模块时才安装，重复调用无副作用。
+    """
+    targets = [
+        ('openai', 'openai.resources.chat.completions', 'Completions'),
+        ('zhipuai', 'zhipuai.api_resource.chat.completions', 'Completions'),
+    ]
+    for sdk_name, module_name, class_name in targets:
+        try:
+            cls = getattr(importlib.import_module(module_name), class_name)
+        except (ImportError, AttributeError):
+            continue
+        if not getattr(cls.create, '_llm_cache_wrapped', False):
+            cls.create = _wrap_completions_create(cls.create, sdk_name)
+
+@app.route('/api/getLlmCacheStats', methods=['POST'])
+def api_get_llm_cache_stats():
+    """获取LLM响应缓存统计"""
+    return jsonify({'success': True, 'stats': llm_cache.get_stats()})
+
+@app.route('/api/clearLlmCache', methods=['POST'])
+def api_clear_llm_cache():
+    """清空LLM响应缓存"""
+    llm_cache.clear()
+    return jsonify({'success': True, 'message': 'LLM缓存已清空'})
+
+# ==================== 知识图谱缓存 ====================
+# 最多缓存的图谱数量，以及按图谱文件大小估算的内存上限（字节）
+KG_CACHE_MAX_GRAPHS = int(os.environ.get('KG_CACHE_MAX_GRAPHS', '8'))
+KG_CACHE_MAX_BYTES = int(os.environ.get('KG_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+# 内存中的networkx图大约是磁盘文件的数倍，用于估算占用
+KG_CACHE_MEMORY_FACTOR = 4
+
+def graph_dir_signature(graph_dir):
+    """图谱目录中所有文件的(相对路径, mtime, 大小)，任一文件变化都会改变签名
+
+    可视化生成的图片不属于图谱数据，不计入签名。
+    """
+    signature = []
+    for root, dirs, files in os.walk(graph_dir):
+        for name in files:
+            if name.lower().endswith('.png'):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature.append((os.path.relpath(path, graph_dir), stat.st_mtime_ns, stat.st_size))
+    return tuple(sorted(signature))
+
+class KnowledgeGraphCache:
+    """进程内的知识图谱LRU缓存
+
+    以图谱目录为键，文件mtime和大小组成的签名变化时自动重新加载；
+    总估算内存超过上限时淘汰最久未使用的图谱。缓存的图谱在多个请求间共享，只应读取。
+    """
+    def __init__(self, max_graphs, max_bytes):
+        self.max_graphs = max_graphs
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # {graph_dir: {'kg', 'signature', 'cost'}}
+        self._lock = threading.Lock()
+        self._load_locks = {}  # {graph_dir: [锁, 正在使用的线程数]}
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+    
+    @contextlib.contextmanager
+    def _load_lock(self, key):
+        """持有同一图谱的加载锁；图谱不在缓存中且没有线程使用时删除该锁，避免锁随访问过的目录无限增长"""
+        with self._lock:
+            holder = self._load_locks.setdefault(key, [threading.Lock(), 0])
+            holder[1] += 1
+        try:
+            with holder[0]:
+                yield
+        finally:
+            with self._lock:
+                holder[1] -= 1
+                self._drop_load_lock(key)
+    
+    def _drop_load_lock(self, key):
+        """图谱已不在缓存中且加载锁无人使用时删除该锁（调用方需持有锁）"""
+        holder = self._load_locks.get(key)
+        if holder is not None and holder[1] == 0 and key not in self._entries:
+            del self._load_locks[key]
+    
+    def get(self, graph_dir):
+        """返回已加载的KnowledgeGraph，必要时从磁盘加载"""
+        key = os.path.abspath(graph_dir)
+        signature = graph_dir_signature(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry['signature'] == signature:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry['kg']
+        
+        # 同一图谱同时只加载一次，其余请求等待加载结果
+        with self._load_lock(key):
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry and entry['signature'] == signature:
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return entry['kg']
+                self.stats['misses'] += 1
+            
+            kg = sparklearn.KnowledgeGraph()
+            kg.load_knowledge_graph(graph_dir)
+            cost = sum(size for _, _, size in signature) * KG_CACHE_MEMORY_FACTOR
+            
+            with self._lock:
+                self._entries[key] = {'kg': kg, 'signature': signature, 'cost': cost, 'derived': {}}
+                self._entries.move_to_end(key)
+                self._evict()
+            return kg
+    
+    def get_derived(self, graph_dir, name, builder):
+        """获取由图谱派生的数据（如邻接索引），随图谱一起缓存和失效
+
+        builder(kg)只会在图谱首次加载或变化后调用一次。
+        """
+        kg = self.get(graph_dir)
+        key = os.path.abspath(graph_dir)
+        with self._load_lock(key):
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry['kg'] is kg and name in entry['derived']:
+                    return entry['derived'][name]
+            value = builder(kg)
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry['kg'] is kg:
+                    entry['derived'][name] = value
+            return value
+    
+    def _evict(self):
+        """淘汰最久未使用的图谱（调用方需持有锁），最新加载的图谱总是保留"""
+        total = sum(e['cost'] for e in self._entries.values())
+        while len(self._entries) > 1 and (len(self._entries) > self.max_graphs or total > self.max_bytes):
+            key, entry = self._entries.popitem(last=False)
+            total -= entry['cost']
+            self.stats['evictions'] += 1
+            self._drop_load_lock(key)
+    
+    def invalidate(self, graph_dir=None):
+        """使指定图谱（或全部图谱）的缓存失效，图谱被重新构建后调用"""
+        with self._lock:
+            if graph_dir is None:
+                self.stats['invalidations'] += len(self._entries)
+                self._entries.clear()
+                for key in list(self._load_locks):
+                    self._drop_load_lock(key)
+                return
+            key = os.path.abspath(graph_dir)
+            if self._entries.pop(key, None) is not None:
+                self.stats['invalidations'] += 1
+            self._drop_load_lock(key)
+    
+    def get_stats(self):
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'hit_ratio': round(self.stats['hits'] / lookups, 4) if lookups else 0.0,
+                'graphs': len(self._entries),
+                'estimated_bytes': sum(e['cost'] for e in self._entries.values()),
+                'max_graphs': self.max_graphs,
+                'max_bytes': self.max_bytes
+            }
+
+kg_cache = KnowledgeGraphCache(KG_CACHE_MAX_GRAPHS, KG_CACHE_MAX_BYTES)
+
+def invalidate_kg_cache(graph_dir=None):
+    """使图谱缓存失效；在worker进程中同时通知服务进程，使其丢弃已缓存的旧图谱"""
+    kg_cache.invalidate(graph_dir)
+    if _worker_progress_queue is not None:
+        _worker_progress_queue.put(('kg_invalidate', graph_dir))
+
+@app.route('/api/getKgCacheStats', methods=['POST'])
+def api_get_kg_cache_stats():
+    """获取知识图谱缓存统计"""
+    return jsonify({'success': True, 'stats': kg_cache.get_stats()})
+
+# ==================== 图谱布局 ====================
+# 服务端预计算的节点坐标，与预计算的图谱数据一样放在graph目录旁边
+GRAPH_LAYOUT_FILE = 'graph_layout.json'
+GRAPH_LAYOUT_SEED = 42
+# 前端画布坐标范围
+GRAPH_LAYOUT_SCALE = 1000
+GRAPH_LAYOUT_ITERATIONS = int(os.environ.get('GRAPH_LAYOUT_ITERATIONS', '50'))
+# 超过该节点数时不计算布局，由前端自行布局。networkx 3.1在500个节点以上使用_sparse_fruchterman_reingold，
+# 每轮迭代在Python中逐个节点循环，代价随节点数平方增长；
+# bench_graph实测50轮迭代：1000个节点约7秒，2000个约19秒，3000个约40秒
+GRAPH_LAYOUT_MAX_NODES = int(os.environ.get('GRAPH_LAYOUT_MAX_NODES', '2000'))
+
+def compute_graph_layout(kg, seed=GRAPH_LAYOUT_SEED):
+    """使用固定随机种子的networkx弹簧布局计算节点坐标，返回{节点: (x, y)}"""
+    import networkx as nx
+    
+    if kg.graph.number_of_nodes() == 0:
+        return {}
+    positions = nx.spring_layout(kg.graph, seed=seed, iterations=GRAPH_LAYOUT_ITERATIONS,
+                                 scale=GRAPH_LAYOUT_SCALE)
+    return {node: (round(float(x), 2), round(float(y), 2)) for node, (x, y) in positions.items()}
+
+def get_graph_layout(graph_dir, kg=None, compute=True):
+    """读取缓存的图谱布局，图谱已变化时重新计算；节点过多时返回None
+
+    compute为False时只读取缓存，缓存不可用时返回None（请求线程中不计算布局）
+    """
+    etag = graph_etag(graph_dir)
+    layout_path = os.path.join(os.path.dirname(os.path.abspath(graph_dir)), GRAPH_LAYOUT_FILE)
+    try:
+        with open(layout_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get('etag') == etag and cached.get('seed') == GRAPH_LAYOUT_SEED:
+            # 节点ID可能不是字符串，因此按[id, x, y]列表存储
+            return {node: (x, y) for node, x, y in cached['positions']}
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    
+    if not compute:
+        return None
+    kg = kg or kg_cache.get(graph_dir)
+    if kg.graph.number_of_nodes() > GRAPH_LAYOUT_MAX_NODES:
+        print(f"⚠️ 图谱节点数超过 {GRAPH_LAYOUT_MAX_NODES}，跳过服务端布局")
+        return None
+    
+    start = time.monotonic()
+    positions = compute_graph_layout(kg)
+    with open(layout_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'etag': etag,
+            'seed': GRAPH_LAYOUT_SEED,
+            'positions': [[node, x, y] for node, (x, y) in positions.items()]
+        }, f, ensure_ascii=False, default=str)
+    print(f"📐 图谱布局计算完成: {len(positions)} 个节点，耗时 {time.monotonic() - start:.1f} 秒")
+    return positions
+
+# ==================== 预计算的图谱数据 ====================
+# 预压缩的前端图谱数据放在graph目录旁边（放在graph目录内会改变图谱签名）
+GRAPH_PAYLOAD_FILE = 'graph_payload.json.gz'
+GRAPH_PAYLOAD_META_FILE = 'graph_payload.meta.json'
+
+def build_graph_payload(kg, positions=None):
+    """把知识图谱转换为前端需要的nodes/links格式，positions不为空时附带节点坐标"""
+    nodes = []
+    links = []
+
+    # 遍历图的节点
+    for node_id, node_data in kg.graph.nodes(data=True):
+        node = {
+            'id': node_id,
+            'name': node_id,  # 或者从 node_data 中提取更友好的名称
+            'val': node_data.get('weight', 5)  # 如果节点有 weight 属性
+        }
+        if positions and node_id in positions:
+            node['x'], node['y'] = positions[node_id]
+        nodes.append(node)
+
+    # 遍历图的边
+    for source, target, edge_data in kg.graph.edges(data=True):
+        links.append({
+            'source': source,
+            'target': target,
+            'label': edge_data.get('type', '关系')
+        })
+    
+    return {
+        'nodes': nodes,
+        'links': links
+    }
+
+def graph_etag(graph_dir):
+    """根据图谱文件签名计算ETag，只需stat文件，不读取内容"""
+    signature = json.dumps(graph_dir_signature(graph_dir))
+    return hashlib.sha256(signature.encode('utf-8')).hexdigest()[:32]
+
+def _graph_payload_paths(graph_dir):
+    tree_dir = os.path.dirname(os.path.abspath(graph_dir))
+    return os.path.join(tree_dir, GRAPH_PAYLOAD_FILE), os.path.join(tree_dir, GRAPH_PAYLOAD_META_FILE)
+
+def write_graph_payload(graph_dir, kg=None, compute_layout=True):
+    """生成并写出预压缩的图谱响应体，返回(etag, gzip字节)
+
+    compute_layout为False时只使用已缓存的布局，没有布局时由前端自行布局
+    """
+    etag = graph_etag(graph_dir)
+    kg = kg or kg_cache.get(graph_dir)
+    positions = get_graph_layout(graph_dir, kg, compute=compute_layout)
+    body = json.dumps({
+        'success': True,
+        'data': build_graph_payload(kg, positions),
+        'has_layout': positions is not None,
+        'message': '知识图谱数据加载成功'
+    }, ensure_ascii=False, default=str).encode('utf-8')
+    compressed = gzip.compress(body, compresslevel=6, mtime=0)
+    
+    payload_path, meta_path = _graph_payload_paths(graph_dir)
+    tmp_path = f'{payload_path}.{uuid.uuid4().hex}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(compressed)
+    os.replace(tmp_path, payload_path)
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump({'etag': etag, 'raw_bytes': len(body), 'gzip_bytes': len(compressed),
+                   'generated_at': datetime.now().isoformat()}, f, indent=2)
+    return etag, compressed
+
+def load_graph_payload(graph_dir):
+    """读取预计算的图谱数据，图谱已变化或文件不存在时重新生成
+
+    在请求线程中调用，重新生成时不计算布局，只有流程的tree步骤会计算布局
+    """
+    etag = graph_etag(graph_dir)
+    payload_path, meta_path = _graph_payload_paths(graph_dir)
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('etag') == etag:
+            with open(payload_path, 'rb') as f:
+                return etag, f.read()
+    except (OSError, ValueError):
+        pass
+    return write_graph_payload(graph_dir, compute_layout=False)
+
+# ==================== 图谱图片渲染 ====================
+GRAPH_IMAGE_FILE = 'graph.png'
+GRAPH_RENDER_META_FILE = 'graph_render.json'
+# lazy：首次请求图片时才渲染；background：流程完成后放入后台队列渲染
+GRAPH_RENDER_MODE = os.environ.get('GRAPH_RENDER_MODE', 'lazy')
+
+# matplotlib不是线程安全的，所有渲染都在同一个后台线程中串行执行
+graph_render_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='graph-render')
+_pending_renders = {}
+_pending_renders_lock = threading.Lock()
+
+def graph_content_hash(graph_dir, previous=None):
+    """图谱文件内容的哈希（不含渲染出的图片），返回(哈希, 文件指纹)"""
+    files = []
+    for root, dirs, names in os.walk(graph_dir):
+        files.extend(os.path.join(root, name) for name in names if not name.lower().endswith('.png'))
+    fingerprints = fingerprint_files(sorted(files), graph_dir, previous)
+    return combined_fingerprint(fingerprints), fingerprints
+
+def _graph_render_meta_path(graph_dir):
+    return os.path.join(os.path.dirname(os.path.abspath(graph_dir)), GRAPH_RENDER_META_FILE)
+
+def _render_graph_image(graph_dir):
+    """渲染graph.png，图谱内容与上次渲染时相同则直接复用，返回(图片路径, 内容哈希)"""
+    meta_path = _graph_render_meta_path(graph_dir)
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        meta = {}
+    
+    content_hash, fingerprints = graph_content_hash(graph_dir, meta.get('files'))
+    image_path = os.path.join(graph_dir, GRAPH_IMAGE_FILE)
+    if meta.get('content_hash') == content_hash and os.path.exists(image_path):
+        return image_path, content_hash
+    
+    start = time.monotonic()
+    kg = kg_cache.get(graph_dir)
+    # 先渲染到临时图片再替换，避免读到写了一半的文件
+    tmp_path = os.path.join(graph_dir, f".graph_{uuid.uuid4().hex}.png")
+    try:
+        kg.visualize(tmp_path)
+        os.replace(tmp_path, image_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump({'content_hash': content_hash, 'files': fingerprints}, f)
+    elapsed = time.monotonic() - start
+    record_metric('observe', 'sparklearn_pipeline_stage_duration_seconds', elapsed, stage='visualize', status='ok')
+    print(f"知识图谱已可视化在: {image_path}（耗时{elapsed:.1f}秒）")
+    return image_path, content_hash
+
+def request_graph_render(graph_dir):
+    """把渲染放入后台队列并返回future，同一图谱正在排队或渲染时复用同一个任务"""
+    key = os.path.abspath(graph_dir)
+    with _pending_renders_lock:
+        future = _pending_renders.get(key)
+        if future is None or future.done():
+            future = graph_render_executor.submit(_render_graph_image, key)
+            _pending_renders[key] = future
+        return future
+
+# ==================== 邻域子图查询 ====================
+# 邻域查询的默认与最大限制
+NEIGHBORHOOD_MAX_DEPTH = 3
+NEIGHBORHOOD_DEFAULT_NODES = 200
+NEIGHBORHOOD_MAX_NODES = 5000
+NEIGHBORHOOD_DEFAULT_EDGES = 1000
+NEIGHBORHOOD_MAX_EDGES = 20000
+
+class GraphAdjacencyIndex:
+    """基于知识图谱预先构建的邻接索引
+
+    节点映射为整数编号，邻居（忽略方向）和出边按编号存储，
+    邻域查询只做整数BFS，不再访问networkx的属性字典。
+    """
+    def __init__(self, graph):
+        self.nodes = list(graph.nodes)
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        self.weights = [graph.nodes[node].get('weight', 5) for node in self.nodes]
+        
+        neighbors = [set() for _ in self.nodes]
+        self.out_edges = [[] for _ in self.nodes]
+        for source, target, edge_data in graph.edges(data=True):
+            s, t = self.index[source], self.index[target]
+            neighbors[s].add(t)
+            neighbors[t].add(s)
+            self.out_edges[s].append((t, edge_data.get('type', '关系')))
+        self.degrees = [len(n) for n in neighbors]
+        # 邻居按度数从大到小排列，截断时优先保留连接多的概念
+        self.neighbors = [sorted(n, key=lambda i: (-self.degrees[i], i)) for n in neighbors]
+    
+    def bfs(self, seeds, depth, limit):
+        """从种子节点出发做k跳BFS，返回按(跳数, 度数)排序的[(编号, 跳数)]，最多limit个"""
+        hops = {}
+        order = []
+        frontier = []
+        for seed in seeds:
+            if seed not in hops:
+                hops[seed] = 0
+                order.append((seed, 0))
+                frontier.append(seed)
+        
+        for hop in range(1, depth + 1):
+            if len(order) >= limit or not frontier:
+                break
+            next_frontier = []
+            for node in frontier:
+                for neighbor in self.neighbors[node]:
+                    if neighbor not in hops:
+                        hops[neighbor] = hop
+                        next_frontier.append(neighbor)
+            next_frontier.sort(key=lambda i: (-self.degrees[i], i))
+            order.extend((node, hop) for node in next_frontier)
+            frontier = next_frontier
+        return order[:limit]
+    
+    def neighborhood(self, concepts, depth=1, max_nodes=NEIGHBORHOOD_DEFAULT_NODES,
+                     max_edges=NEIGHBORHOOD_DEFAULT_EDGES, offset=0):
+        """查询k跳邻域的一页
+
+        节点按(跳数, 度数)排序后分页；返回的边至少有一端在本页中，
+        另一端在本页或之前的页中，前端逐页追加即可得到完整的子图。
+        """
+        seeds = [self.index[c] for c in concepts if c in self.index]
+        missing = [c for c in concepts if c not in self.index]
+        order = self.bfs(seeds, depth, offset + max_nodes + 1)
+        page = order[offset:offset + max_nodes]
+        has_more = len(order) > offset + max_nodes
+        
+        page_ids = {i for i, _ in page}
+        visible = {i for i, _ in order[:offset + max_nodes]}
+        nodes = [{
+            'id': self.nodes[i],
+            'name': self.nodes[i],
+            'val': self.weights[i],
+            'hop': hop,
+            'degree': self.degrees[i]
+        } for i, hop in page]
+        
+        links = []
+        edges_truncated = False
+        for i, _ in order[:offset + max_nodes]:
+            for t, label in self.out_edges[i]:
+                if t in visible and (i in page_ids or t in page_ids):
+                    if len(links) >= max_edges:
+                        edges_truncated = True
+                        break
+                    links.append({'source': self.nodes[i], 'target': self.nodes[t], 'label': label})
+            if edges_truncated:
+                break
+        
+        return {
+            'nodes': nodes,
+            'links': links,
+            'missing': missing,
+            'offset': offset,
+            'next_offset': offset + len(page) if has_more else None,
+            'edges_truncated': edges_truncated
+        }
+
+def _bounded_int(value, default, minimum, maximum):
+    """把请求参数转换为限定范围内的整数"""
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(minimum, min(value, maximum))
+
+@app.route('/api/getGraphNeighborhood', methods=['POST'])
+def api_get_graph_neighborhood():
+    """获取一个或多个概念的k跳邻域子图（分页）"""
+    try:
+        data = request.json or {}
+        output_path = data.get('output_path', '')
+        concepts = data.get('concepts', [])
+        if isinstance(concepts, str):
+            concepts = [concepts]
+        
+        if not output_path:
+            return jsonify({'success': False, 'error': '输出路径不能为空'}), 400
+        if not concepts:
+            return jsonify({'success': False, 'error': '概念列表不能为空'}), 400
+        if not isinstance(concepts, list) or not all(isinstance(c, str) for c in concepts):
+            return jsonify({'success': False, 'error': '概念列表必须是字符串数组'}), 400
+        
+        graph_dir = os.path.join(output_path, "tree", "graph")
+        if not os.path.exists(graph_dir):
+            return jsonify({'success': False, 'error': '知识图谱目录不存在'}), 404
+        
+        index = kg_cache.get_derived(graph_dir, 'adjacency_index', lambda kg: GraphAdjacencyIndex(kg.graph))
+        result = index.neighborhood(
+            concepts,
+            depth=_bounded_int(data.get('depth'), 1, 0, NEIGHBORHOOD_MAX_DEPTH),
+            max_nodes=_bounded_int(data.get('max_nodes'), NEIGHBORHOOD_DEFAULT_NODES, 1, NEIGHBORHOOD_MAX_NODES),
+            max_edges=_bounded_int(data.get('max_edges'), NEIGHBORHOOD_DEFAULT_EDGES, 0, NEIGHBORHOOD_MAX_EDGES),
+            offset=_bounded_int(data.get('offset'), 0, 0, len(index.nodes))
+        )
+        if len(result['missing']) == len(concepts):
+            return jsonify({'success': False, 'error': '概念不存在于知识图谱中', 'missing': result['missing']}), 404
+        
+        return jsonify({'success': True, 'data': result})
+    
+    except Exception as e:
+        logger.error(f"获取邻域子图失败: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/processInput', methods=['POST'])
 def api_process_input():
     """处理输入文件"""
@@ -328,12 +1416,93 @@ def api_process_input():
         input_path = data.get('input_path', '')
         output_path = data.get('output_path', './outputs')
         
-        process_input(input_path, output_path)
+        sparklearn.process_input(input_path, output_path)
         
         return jsonify({'success': True, 'message': '文件处理完成'})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# 编码检测最多只看文件开头这么多字节
+TEXT_DETECT_PREFIX_BYTES = 64 * 1024
+# 超过该大小的文件用mmap读取，避免把整个文件再复制一份
+TEXT_MMAP_THRESHOLD = 4 * 1024 * 1024
+
+# 检测器常把GBK文本报告为GB2312，统一按超集解码，避免生僻字解码失败
+ENCODING_SUPERSETS = {'gb2312': 'gb18030', 'gbk': 'gb18030'}
+# 检测结果的可信度低于该值且为单字节编码时不采信（短的西欧文本常被识别成其他单字节编码，如naïve被识别为iso8859-4），
+# 改按cp1252/latin-1解码；多字节编码的检测结果即使可信度低通常也是对的（短的GBK文本可信度也只有0.1~0.4）
+TEXT_DETECT_MIN_CONFIDENCE = 0.5
+# 合法的UTF-8非ASCII字符数不少于损坏序列数的这个倍数时，按损坏的UTF-8文本处理
+TEXT_UTF8_VALID_RATIO = 4
+TEXT_NON_ASCII_BYTES = bytes(range(0x80, 0x100))
+MULTIBYTE_ENCODINGS = {
+    'gb18030', 'gbk', 'gb2312', 'hz', 'big5', 'big5hkscs', 'cp950', 'cp932', 'shift_jis', 'euc_jp',
+    'iso2022_jp', 'euc_kr', 'cp949', 'johab', 'iso2022_kr', 'utf-16', 'utf-32'
+}
+
+def detect_encoding(data, start=0):
+    """从start开始逐段做增量编码检测，每段最多TEXT_DETECT_PREFIX_BYTES字节，返回(编码, 可信度)
+
+    某一段全是ASCII时检测器只能得出ascii，此时继续检测下一段，直到得出非ASCII编码或数据结束
+    """
+    position = start
+    while position < len(data):
+        end = min(len(data), position + TEXT_DETECT_PREFIX_BYTES)
+        detector = chardet.UniversalDetector()
+        for chunk_start in range(position, end, 8192):
+            detector.feed(bytes(data[chunk_start:min(chunk_start + 8192, end)]))
+            if detector.done:
+                break
+        detector.close()
+        encoding = detector.result.get('encoding')
+        if encoding and encoding.lower() != 'ascii':
+            return ENCODING_SUPERSETS.get(encoding.lower(), encoding), detector.result.get('confidence') or 0.0
+        position = end
+    return None, 0.0
+
+def decode_text(data):
+    """把字节解码为文本：优先按严格UTF-8解码，失败时从第一个无法解码的字节开始检测编码"""
+    if data[:3] == codecs.BOM_UTF8:
+        data = data[3:]
+    try:
+        return str(data, 'utf-8')
+    except UnicodeDecodeError as e:
+        failed_at = e.start
+    
+    # 非ASCII字符绝大多数能按UTF-8解码时，视为夹杂少量损坏字节的UTF-8文本，不再检测编码；
+    # 其他编码的文本偶尔也能凑出合法的UTF-8双字节序列，但占比很低
+    text = str(data, 'utf-8', errors='replace')
+    invalid = text.count('\ufffd')
+    ascii_chars = len(bytes(data).translate(None, TEXT_NON_ASCII_BYTES))
+    if len(text) - ascii_chars - invalid >= TEXT_UTF8_VALID_RATIO * invalid:
+        return text
+    
+    encoding, confidence = detect_encoding(data, failed_at)
+    try:
+        codec = codecs.lookup(encoding).name if encoding else None
+    except LookupError:
+        codec = None
+    
+    if codec and codec != 'utf-8':
+        if confidence >= TEXT_DETECT_MIN_CONFIDENCE or codec in MULTIBYTE_ENCODINGS:
+            return str(data, encoding, errors='replace')
+        # 可信度低的单字节编码按西欧文本解码；cp1252中有5个未定义的字节，遇到时改用latin-1（不会失败）
+        try:
+            return str(data, 'cp1252')
+        except UnicodeDecodeError:
+            return str(data, 'latin-1')
+    # 无法解码的字节显示为替换字符，而不是被静默丢弃
+    return str(data, 'utf-8', errors='replace')
+
+def read_text_file(path):
+    """读取文本文件，只读一次，大文件通过mmap解码"""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < TEXT_MMAP_THRESHOLD:
+            return decode_text(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            return decode_text(view)
+
 @app.route('/api/augmentFile', methods=['POST'])
 def api_augment_file():
     """增强文件"""
@@ -341,15 +1510,8 @@ def api_augment_file():
         data = request.json
         input_path = data.get('input_path', '')
         
-        annotator = SimplifiedAnnotator()
-        
-        # 检测文件编码
-        with open(input_path, 'rb') as f:
-            raw_data = f.read()
-            detected_encoding = chardet.detect(raw_data)['encoding']
-        
-        with open(input_path, 'r', encoding=detected_encoding, errors='ignore') as f:
-            content = f.read()
+        annotator = sparklearn.SimplifiedAnnotator()
+        content = read_text_file(input_path)
         
         annotator.process(content, input_path)
         
@@ -357,36 +1519,160 @@ def api_augment_file():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# 流式生成题目时的并发数，默认与星火的并发上限一致（题目生成使用星火接口），不能超过该上限
+QA_CONCURRENCY = int(os.environ.get('QA_CONCURRENCY', '0'))
+
+def _qa_level(difficulty):
+    """把前端的难度转换为生成器使用的等级"""
+    if difficulty == '简单':
+        return 'easy'
+    elif difficulty == '中等':
+        return 'medium'
+    return 'hard'
+
+def _graph_content_fingerprint(graph_path):
+    """图谱目录内容的指纹，用于题目缓存键"""
+    if not os.path.isdir(graph_path):
+        return graph_path
+    graph_files = [os.path.join(graph_path, f) for f in sorted(os.listdir(graph_path))
+                   if os.path.isfile(os.path.join(graph_path, f)) and not f.lower().endswith('.png')]
+    return combined_fingerprint(fingerprint_files(graph_files, graph_path))
+
+def qa_output_file(output, suffix):
+    """题目结果文件路径：output为目录时写入其中的QA子目录，否则直接使用output"""
+    if os.path.isdir(output) or not os.path.splitext(output)[1]:
+        qa_dir = os.path.join(output, 'QA')
+        os.makedirs(qa_dir, exist_ok=True)
+        return os.path.join(qa_dir, f"qa_{datetime.now().strftime('%Y%m%d_%H%M%S')}{suffix}")
+    return output
+
+def generate_questions(kg, graph_fingerprint, concepts, level, save_path=''):
+    """为一组概念生成题目，返回(结果, 是否命中缓存)
+
+    星火问答生成走websocket，无法在SDK层缓存，这里按图谱内容+概念+难度缓存整个结果。
+    未命中缓存时占用星火的服务商并发配额（与增广共享），同时进行的增广和出题总并发不超过上限。
+    """
+    cache_key = llm_cache.make_key(
+        kind='generateQA',
+        graph=graph_fingerprint,
+        concepts=concepts,
+        level=level,
+        appid=api_config['APPID']
+    )
+    result = llm_cache.get(cache_key)
+    if result is not None:
+        return result, True
+    
+    generator = sparklearn.KnowledgeQuestionGenerator(
+        kg,
+        appid=api_config['APPID'],
+        api_key=api_config['APIKEY'],
+        api_secret=api_config['APISecret']
+    )
+    with AugmentScheduler._semaphore_for('spark'):
+        start = time.perf_counter()
+        try:
+            result = generator.generate_for_concept_sequence(concept_sequence=concepts, level=level,
+                                                             save_path=save_path)
+        except Exception as e:
+            record_metric('inc', 'sparklearn_llm_errors_total', source='spark',
+                          error_type=classify_api_error(e)['error_type'])
+            raise
+        duration = time.perf_counter() - start
+    record_metric('observe', 'sparklearn_llm_request_duration_seconds', duration, source='spark')
+    llm_cache.set(cache_key, result, meta={'kind': 'generateQA'})
+    return result, False
+
+def _ndjson(data):
+    return json.dumps(data, ensure_ascii=False, default=str) + '\n'
+
+def _profiled_stream(events, profile_dir, name):
+    """在整个流式响应期间剖析"""
+    with Profiler(profile_dir, name):
+        yield from events
+
+def _stream_generate_qa(kg, graph_fingerprint, concepts, level, output, concurrency, profile_dir=None):
+    """按概念并发生成题目，每完成一个就以NDJSON推送给前端并追加写入结果文件"""
+    output_file = qa_output_file(output, '.jsonl') if output else None
+    # 与AugmentScheduler一样，客户端指定的并发数只能在服务商上限以内调低
+    provider_limit = get_provider_concurrency('spark')
+    workers = max(1, min(len(concepts), int(concurrency or QA_CONCURRENCY or provider_limit), provider_limit))
+    
+    def stream():
+        yield _ndjson({'type': 'start', 'total': len(concepts), 'output_file': output_file})
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='qa-worker')
+        futures = {pool.submit(generate_questions, kg, graph_fingerprint, [concept], level): concept
+                   for concept in concepts}
+        completed, failed = 0, 0
+        try:
+            for future in as_completed(futures):
+                concept = futures[future]
+                try:
+                    result, cached = future.result()
+                except Exception as e:
+                    logger.error(f"概念 {concept} 生成题目失败: {str(e)}")
+                    failed += 1
+                    yield _ndjson({'type': 'error', 'concept': concept, **handle_api_error(e, "生成问答对")})
+                    continue
+                
+                record = {'concept': concept, 'level': level, 'result': result}
+                if output_file:
+                    with open(output_file, 'a', encoding='utf-8') as f:
+                        f.write(_ndjson(record))
+                completed += 1
+                yield _ndjson({'type': 'question', 'completed': completed, 'total': len(concepts),
+                               'cached': cached, **record})
+            
+            yield _ndjson({'type': 'done', 'success': failed < len(concepts), 'completed': completed,
+                           'failed': failed, 'output_file': output_file})
+        finally:
+            # 客户端断开时取消尚未开始的概念
+            pool.shutdown(wait=False, cancel_futures=True)
+    
+    events = stream()
+    if profile_dir:
+        events = _profiled_stream(events, profile_dir, 'generateQA')
+    return Response(stream_with_context(events), mimetype='application/x-ndjson', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/api/generateQA', methods=['POST'])
 def api_generate_qa():
-    """生成问答对"""
+    """生成问答对
+
+    stream为true时按概念并发生成，并以NDJSON逐条返回结果；
+    profile为true时剖析本次生成，结果写在输出目录（与state.json同目录）。
+    """
     try:
         data = request.json
         graph_path = data.get('graphPath', '')
         concepts = data.get('concepts', [])
-        difficulty = data.get('difficulty', '简单')
+        difficulty = _qa_level(data.get('difficulty', '简单'))
         output= data.get('output', '')
-        if difficulty == '简单':
-            difficulty = 'easy'
-        elif difficulty == '中等':
-            difficulty = 'medium'
-        else:
-            difficulty = 'hard'
         print("concepts:", concepts)
         print("difficulty:", difficulty)
         print("output:", output)
 
-        kg = KnowledgeGraph()
-        kg.load_knowledge_graph(graph_path)
-        
-        generator = KnowledgeQuestionGenerator(
-            kg,
-            appid=api_config['APPID'],
-            api_key=api_config['APIKEY'],
-            api_secret=api_config['APISecret']
-        )
-        
-        result = generator.generate_for_concept_sequence(concept_sequence=concepts,level=difficulty,save_path=output)
+        # 未指定输出目录时，剖析结果写到图谱所在的输出目录（graph_path为<输出目录>/tree/graph）
+        profile_dir = None
+        if data.get('profile'):
+            profile_dir = output or os.path.dirname(os.path.dirname(os.path.abspath(graph_path)))
+        
+        if data.get('stream'):
+            graph_fingerprint = _graph_content_fingerprint(graph_path)
+            kg = kg_cache.get(graph_path)
+            return _stream_generate_qa(kg, graph_fingerprint, concepts, difficulty, output, data.get('concurrency'),
+                                       profile_dir=profile_dir)
+        
+        with profile_section(profile_dir is not None, profile_dir, 'generateQA'):
+            graph_fingerprint = _graph_content_fingerprint(graph_path)
+            kg = kg_cache.get(graph_path)
+            result, cached = generate_questions(kg, graph_fingerprint, concepts, difficulty, save_path=output)
+        if cached and output:
+            # 命中缓存时生成器不会运行，由这里写出结果
+            with open(qa_output_file(output, '.json'), 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
         # print('result',result)
         return jsonify({
             'success': True, 
@@ -408,13 +1694,17 @@ def api_build_knowledge_graph():
         input_path = data.get('input_path', '')
         output_path = data.get('output_path', './outputs')
         
-        # 设置环境变量
-        os.environ['meta_path'] = output_path
-        os.environ['raw_path'] = input_path
-        
-        # 导入并运行知识图谱构建
-        from kg_construction.main import main
-        main()
+        # 在worker进程中运行，环境变量的修改不会影响其他请求
+        if PIPELINE_ISOLATION == 'process':
+            run_in_worker(_build_knowledge_graph_in_worker, input_path, output_path)
+        else:
+            os.environ['meta_path'] = output_path
+            os.environ['raw_path'] = input_path
+            install_llm_cache_hooks()
+            from kg_construction.main import main
+            main()
+        # 图谱已重新生成，丢弃所有缓存的旧图谱
+        kg_cache.invalidate()
         
         return jsonify({'success': True, 'message': '知识图谱构建完成'})
     except Exception as e:
@@ -423,203 +1713,696 @@ def api_build_knowledge_graph():
         error_response = handle_api_error(e, "构建知识图谱")
         return jsonify(error_response), 500
 
-@app.route('/api/runPipeline', methods=['POST'])
-def api_run_pipeline():
-    """运行完整的处理流程"""
+# ==================== 并行预处理 ====================
+# 预处理支持的文件类型（与选择输入对话框保持一致）
+PREPROCESS_EXTENSIONS = {
+    '.md', '.docx', '.pdf', '.ppt', '.pptx', '.txt', '.html', '.htm',
+    '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.svg'
+}
+# 并行预处理默认进程数
+PREPROCESS_WORKERS = int(os.environ.get('PREPROCESS_WORKERS', str(os.cpu_count() or 1)))
+
+def collect_preprocess_files(input_path, output_path=None):
+    """收集需要预处理的文件，跳过位于输出目录中的文件"""
+    if os.path.isfile(input_path):
+        return [input_path]
+    
+    output_abs = os.path.abspath(output_path) if output_path else None
+    files = []
+    for root, dirs, names in os.walk(input_path):
+        if output_abs and os.path.abspath(root).startswith(output_abs):
+            dirs[:] = []
+            continue
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() in PREPROCESS_EXTENSIONS:
+                files.append(os.path.join(root, name))
+    return files
+
+def _is_own_output(name, stem, is_dir):
+    """输出是否属于该输入：文件名为“stem.扩展名”，或目录名恰好为stem
+
+    只按前缀匹配会把a.txt与ab.txt、lecture1与lecture10的输出混在一起
+    """
+    return name == stem if is_dir else os.path.splitext(name)[0] == stem
+
+def _output_snapshot(output_dir, stem):
+    """输入对应输出目录（与输入相同的相对子目录）中属于该输入的文件及其修改时间"""
+    snapshot = {}
+    if not os.path.isdir(output_dir):
+        return snapshot
+    for name in os.listdir(output_dir):
+        path = os.path.join(output_dir, name)
+        is_dir = os.path.isdir(path)
+        if not _is_own_output(name, stem, is_dir):
+            continue
+        if is_dir:
+            for root, _, names in os.walk(path):
+                for child in names:
+                    child_path = os.path.join(root, child)
+                    snapshot[child_path] = os.stat(child_path).st_mtime_ns
+        else:
+            snapshot[path] = os.stat(path).st_mtime_ns
+    return snapshot
+
+def _preprocess_single_file(file_path, output_dir):
+    """预处理单个文件，返回(错误信息, 输出文件列表)，成功时错误信息为None
+
+    输出文件是处理期间新建或改写、且名为“输入文件名.扩展名”（或位于同名目录中）的文件，
+    用于增量模式清理已删除输入的产物
+    """
     try:
-        data = request.json
-        input_path = data.get('input_path', '')
-        output_path = data.get('output_path', './outputs')
-        selected_steps = data.get('steps', ['preprocess', 'augment', 'tree'])
-        
-        # 验证输入路径
-        if not input_path or not os.path.exists(input_path):
-            error_response = handle_api_error(Exception('输入路径不存在'), "验证输入路径")
-            error_response['error'] = '输入路径不存在'
-            return jsonify(error_response), 400
-        
-        # 创建输出目录
-        os.makedirs(output_path, exist_ok=True)
-        
-        # 状态文件路径
-        state_path = os.path.join(output_path, 'state.json')
+        os.chdir(str(submodule_path))
+        os.makedirs(output_dir, exist_ok=True)
+        stem = os.path.splitext(os.path.basename(file_path))[0]
+        before = _output_snapshot(output_dir, stem)
+        sparklearn.process_input(file_path, output_dir)
+        after = _output_snapshot(output_dir, stem)
+        return None, sorted(path for path, mtime in after.items() if before.get(path) != mtime)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}", []
+
+def _preprocess_pool(workers):
+    # 服务进程是多线程的，使用spawn启动子进程以避免fork时继承其他线程持有的锁
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+def _preprocess_isolated(file_path, output_dir):
+    """在单独的子进程中预处理一个文件，子进程崩溃只记为该文件失败"""
+    with _preprocess_pool(1) as pool:
+        try:
+            return pool.submit(_preprocess_single_file, file_path, output_dir).result()
+        except BrokenProcessPool:
+            return "BrokenProcessPool: 预处理子进程异常退出", []
+
+def preprocess_folder_parallel(input_path, output_path, workers=None, job_id=None, progress_range=(0, 100), files=None,
+                               in_process=False):
+    """使用进程池并行预处理输入目录中的文件
+
+    每个文件单独转换，输出目录保持与输入相同的子目录结构；
+    单个文件失败只会被记录，不会中断其余文件。files指定时只处理这些文件；
+    in_process为True时不启动进程池，在当前进程中逐个处理。
+    返回处理统计、失败列表和每个成功文件的输出文件列表。
+    """
+    if files is None:
+        files = collect_preprocess_files(input_path, output_path)
+    if not files:
+        raise PipelineError({'success': False, 'error': '输入路径中没有可预处理的文件'}, 400)
+    
+    input_root = input_path if os.path.isdir(input_path) else os.path.dirname(input_path)
+    output_dirs = {
+        file_path: os.path.normpath(os.path.join(output_path, os.path.relpath(os.path.dirname(file_path), input_root)))
+        for file_path in files
+    }
+    workers = max(1, min(int(workers or PREPROCESS_WORKERS), len(files)))
+    start_pct, end_pct = progress_range
+    failures = []
+    outputs = {}
+    done = 0
+    
+    def finish(file_path, error, file_outputs):
+        nonlocal done
+        done += 1
+        if error:
+            failures.append({'file': file_path, 'error': error})
+            print(f"❌ 预处理失败: {file_path} - {error}")
+        else:
+            outputs[file_path] = file_outputs
         
-        # 加载状态
-        state = {}
-        if os.path.exists(state_path):
+        percentage = start_pct + int((end_pct - start_pct) * done / len(files))
+        update_progress("🔧 预处理原始文件...", percentage,
+                        f"已处理 {done}/{len(files)} 个文件：{os.path.basename(file_path)}", job_id=job_id)
+    
+    if in_process:
+        original_cwd = os.getcwd()
+        try:
+            for file_path in files:
+                finish(file_path, *_preprocess_single_file(file_path, output_dirs[file_path]))
+        finally:
+            os.chdir(original_cwd)
+        unfinished = []
+    else:
+        # 子进程崩溃（如解析库段错误）会使整个进程池失效，所有未完成的任务都会抛出BrokenProcessPool；
+        # 这些文件随后逐个在独立进程中重试，只有真正导致崩溃的文件被记为失败
+        unfinished = []
+        with _preprocess_pool(workers) as pool:
+            futures = {pool.submit(_preprocess_single_file, file_path, output_dirs[file_path]): file_path
+                       for file_path in files}
+            for future in as_completed(futures):
+                file_path = futures[future]
+                try:
+                    error, file_outputs = future.result()
+                except BrokenProcessPool:
+                    unfinished.append(file_path)
+                    continue
+                except Exception as e:
+                    error, file_outputs = f"{type(e).__name__}: {e}", []
+                finish(file_path, error, file_outputs)
+    
+    if unfinished:
+        print(f"⚠️ 预处理子进程异常退出，{len(unfinished)} 个未完成的文件将逐个在独立进程中重试")
+        with ThreadPoolExecutor(max_workers=min(workers, len(unfinished))) as retry_pool:
+            futures = {retry_pool.submit(_preprocess_isolated, file_path, output_dirs[file_path]): file_path
+                       for file_path in unfinished}
+            for future in as_completed(futures):
+                finish(futures[future], *future.result())
+    
+    if len(failures) == len(files):
+        raise RuntimeError(f"所有文件预处理均失败，首个错误: {failures[0]['error']}")
+    
+    return {'total': len(files), 'succeeded': len(files) - len(failures), 'failed': failures, 'outputs': outputs}
+
+# ==================== 增广并发调度 ====================
+# 各模型服务商的默认并发上限，可通过环境变量 AUGMENT_CONCURRENCY_<PROVIDER> 覆盖
+AUGMENT_PROVIDER_CONCURRENCY = {
+    'spark': 4,
+    'silicon': 16,
+    'openai': 16,
+    'chatglm': 8
+}
+AUGMENT_DEFAULT_CONCURRENCY = 4
+
+# 遇到这些错误时继续请求没有意义，立即停止剩余文件
+AUGMENT_FATAL_ERROR_TYPES = ('auth_error', 'balance_error')
+
+def get_provider_concurrency(provider):
+    """获取模型服务商的并发上限"""
+    env_value = os.environ.get(f'AUGMENT_CONCURRENCY_{str(provider).upper()}')
+    if env_value:
+        return max(1, int(env_value))
+    return AUGMENT_PROVIDER_CONCURRENCY.get(provider, AUGMENT_DEFAULT_CONCURRENCY)
+
+class AugmentScheduler:
+    """按模型服务商限制并发的增广调度器
+
+    同一服务商的信号量在所有任务间共享，多个流程同时运行时总并发也不会超过上限；
+    concurrency只能在上限以内调低单个任务的并发数。
+    """
+    _provider_semaphores = {}
+    _semaphores_lock = threading.Lock()
+    
+    def __init__(self, provider, concurrency=None, job_id=None, progress_range=(0, 100)):
+        self.provider = provider
+        provider_limit = get_provider_concurrency(provider)
+        self.concurrency = max(1, min(int(concurrency or provider_limit), provider_limit))
+        self.job_id = job_id
+        self.progress_range = progress_range
+        self._lock = threading.Lock()
+        self._abort = threading.Event()
+        self.total = 0
+        self.completed = 0
+        self.failed = []
+        self.in_flight = 0
+        self.total_latency = 0.0
+        self.started_at = None
+    
+    @classmethod
+    def _semaphore_for(cls, provider):
+        with cls._semaphores_lock:
+            if provider not in cls._provider_semaphores:
+                cls._provider_semaphores[provider] = threading.BoundedSemaphore(get_provider_concurrency(provider))
+            return cls._provider_semaphores[provider]
+    
+    def stats(self):
+        """当前吞吐量统计"""
+        with self._lock:
+            elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+            finished = self.completed + len(self.failed)
+            return {
+                'provider': self.provider,
+                'concurrency': self.concurrency,
+                'total': self.total,
+                'completed': self.completed,
+                'failed': list(self.failed),
+                'in_flight': self.in_flight,
+                'elapsed_seconds': round(elapsed, 2),
+                'files_per_second': round(finished / elapsed, 3) if elapsed > 0 else 0.0,
+                'avg_latency_seconds': round(self.total_latency / finished, 2) if finished else 0.0
+            }
+    
+    def _augment_one(self, file_path):
+        if self._abort.is_set():
+            return
+        with self._semaphore_for(self.provider):
+            if self._abort.is_set():
+                return
+            with self._lock:
+                self.in_flight += 1
+            start = time.monotonic()
+            error = None
             try:
-                with open(state_path, 'r', encoding='utf-8') as f:
-                    state = json.load(f)
+                content = read_text_file(file_path)
+                sparklearn.SimplifiedAnnotator().process(content, file_path)
             except Exception as e:
-                print(f"⚠️ 状态文件加载失败: {str(e)}")
-                state = {}
-        
-        # 定义步骤
-        step_names = {
-            'preprocess': "预处理原始文件",
-            'augment': "增广文本", 
-            'tree': "构建知识树结构"
-        }
-        
-        # 步骤说明
-        step_descriptions = {
-            'preprocess': "将各种格式的文档（PDF、Word、PPT等）转换为Markdown格式，提取文本内容",
-            'augment': "使用AI模型对文本进行增广，生成更多相关内容和知识点",
-            'tree': "基于增广后的文本构建知识图谱，生成可视化的知识树结构"
-        }
-        
-        # 检查输入文件类型（如果只选择后面的步骤）
-        if not 'preprocess' in selected_steps and ('augment' in selected_steps or 'tree' in selected_steps):
-            # 检查输入是否为md文件
-            if os.path.isfile(input_path):
-                if not input_path.lower().endswith('.md'):
-                    error_response = handle_api_error(Exception('跳过预处理步骤时，输入必须是.md文件'), "验证文件类型")
-                    error_response['error'] = '跳过预处理步骤时，输入必须是.md文件'
-                    return jsonify(error_response), 400
+                error = e
+            latency = time.monotonic() - start
+        
+        with self._lock:
+            self.in_flight -= 1
+            self.total_latency += latency
+            if error is None:
+                self.completed += 1
             else:
-                # 检查目录中是否有md文件
-                has_md_files = False
-                for root, dirs, files in os.walk(input_path):
-                    for file in files:
-                        if file.lower().endswith('.md'):
-                            has_md_files = True
-                            break
-                    if has_md_files:
-                        break
-                
-                if not has_md_files:
-                    error_response = handle_api_error(Exception('跳过预处理步骤时，输入目录必须包含.md文件'), "验证文件类型")
-                    error_response['error'] = '跳过预处理步骤时，输入目录必须包含.md文件'
-                    return jsonify(error_response), 400
-        
-        # 执行选中的步骤
-        total_steps = len(selected_steps)
-        completed_steps = 0
-        
-        for step in ['preprocess', 'augment', 'tree']:
-            if step in selected_steps:
-                # 检查状态，如果已完成则询问是否继续执行
-                if state.get(step, False):
-                    print(f"⚠️ 步骤 {step_names[step]} 已完成，继续执行将覆盖之前的结果")
-                    # 这里可以选择继续执行，因为用户已经明确选择了这个步骤
-                
-                # 更新进度
-                step_percentage = int((completed_steps / total_steps) * 100)
-                update_progress(f"🔧 {step_names[step]}...", step_percentage, f"正在执行第{completed_steps + 1}/{total_steps}个步骤")
-                print(f"⏳ 正在执行: {step_names[step]}...")
-                
-                if step == 'preprocess':
-                    # 保存当前工作目录
-                    original_cwd = os.getcwd()
-                    
-                    try:
-                        # 切换到SparkLearn目录
-                        sparklearn_dir = os.path.join(os.path.dirname(__file__), 'submodule', 'SparkLearn')
-                        os.chdir(sparklearn_dir)
-                        
-                        from main import process_folder
-                        process_folder(input_path, output_path)
-                        
-                        # 更新进度
-                        completed_steps += 1
-                        step_percentage = int((completed_steps / total_steps) * 100)
-                        update_progress(f"✅ {step_names[step]}完成", step_percentage, f"已完成第{completed_steps}/{total_steps}个步骤")
-                    finally:
-                        # 恢复原始工作目录
-                        os.chdir(original_cwd)
-                
-                elif step == 'augment': # 隐患：如果选择的输出文件夹不是空的，可能会出现问题
-                    # 保存当前工作目录
-                    original_cwd = os.getcwd()
-                    
-                    try:
-                        # 切换到SparkLearn目录
-                        sparklearn_dir = os.path.join(os.path.dirname(__file__), 'submodule', 'SparkLearn')
-                        os.chdir(sparklearn_dir)
-                        
-                        from main import augment_folder
-                        # 如果跳过了预处理，直接使用输入路径
-                        if 'preprocess' in selected_steps:
-                            processed_path = output_path
-                        else:
-                            processed_path = input_path
-                        augment_folder(processed_path)
-                        
-                        # 更新进度
-                        completed_steps += 1
-                        step_percentage = int((completed_steps / total_steps) * 100)
-                        update_progress(f"✅ {step_names[step]}完成", step_percentage, f"已完成第{completed_steps}/{total_steps}个步骤")
-                    finally:
-                        # 恢复原始工作目录
-                        os.chdir(original_cwd)
-                
-                elif step == 'tree':
-                    # 保存当前工作目录
-                    original_cwd = os.getcwd()
-                    
-                    try:
-                        # 切换到SparkLearn目录
-                        sparklearn_dir = os.path.join(os.path.dirname(__file__), 'submodule', 'SparkLearn')
-                        os.chdir(sparklearn_dir)
-                        
-                        from main import tree_folder
-                        # 如果跳过了预处理，直接使用输入路径
-                        if 'preprocess' in selected_steps:
-                            processed_path = output_path
-                        else:
-                            processed_path = input_path
-                            # 额外检查：确保tree步骤的输入只包含.md文件
-                            if os.path.isdir(processed_path):
-                                has_md_files = False
-                                for root, dirs, files in os.walk(processed_path):
-                                    for file in files:
-                                        if file.lower().endswith('.md'):
-                                            has_md_files = True
-                                            break
-                                    if has_md_files:
-                                        break
-                                if not has_md_files:
-                                    error_response = handle_api_error(Exception('tree步骤需要.md文件作为输入，请先运行预处理步骤'), "验证文件类型")
-                                    error_response['error'] = 'tree步骤需要.md文件作为输入，请先运行预处理步骤'
-                                    return jsonify(error_response), 400
-                        
-                        tree_output = os.path.join(output_path, "tree")
-                        # 确保tree_output目录存在
-                        os.makedirs(tree_output, exist_ok=True)
-                        
-                        # 更新环境变量，确保使用处理后的md文件路径
-                        os.environ['raw_path'] = processed_path
-                        tree_folder(processed_path, tree_output)
-                        
-                        # 更新进度
-                        completed_steps += 1
-                        step_percentage = int((completed_steps / total_steps) * 100)
-                        update_progress(f"✅ {step_names[step]}完成", step_percentage, f"已完成第{completed_steps}/{total_steps}个步骤")
-                    finally:
-                        # 恢复原始工作目录
-                        os.chdir(original_cwd)
-                    
-                    # 生成知识图谱可视化
-                    graph_dir = os.path.join(tree_output, "graph")
-                    if os.path.exists(graph_dir):
-                        kg = KnowledgeGraph()
-                        kg.load_knowledge_graph(graph_dir)
-                        graph_png = os.path.join(graph_dir, "graph.png")
-                        kg.visualize(graph_png)
-                        print(f"知识图谱已构建并可视化在: {graph_png}")
-                
-                # 更新状态
-                state[step] = True
-                with open(state_path, 'w', encoding='utf-8') as f:
-                    json.dump(state, f, indent=2)
+                self.failed.append({'file': file_path, 'error': str(error)})
+            finished = self.completed + len(self.failed)
+        
+        if error is not None:
+            print(f"❌ 增广失败: {file_path} - {error}")
+            if handle_api_error(error)['error_type'] in AUGMENT_FATAL_ERROR_TYPES:
+                self._abort.set()
+                raise error
+        
+        stats = self.stats()
+        start_pct, end_pct = self.progress_range
+        percentage = start_pct + int((end_pct - start_pct) * finished / self.total)
+        update_progress("🔧 增广文本...", percentage,
+                        f"已增广 {finished}/{self.total} 个文件，{stats['files_per_second']} 文件/秒，进行中 {stats['in_flight']}",
+                        job_id=self.job_id)
+    
+    def run(self, files):
+        """并发增广所有文件，返回统计信息"""
+        self.total = len(files)
+        self.started_at = time.monotonic()
+        fatal_error = None
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=f'augment-{self.provider}') as pool:
+            for future in as_completed([pool.submit(self._augment_one, f) for f in files]):
+                try:
+                    future.result()
+                except Exception as e:
+                    fatal_error = fatal_error or e
+        
+        if fatal_error is not None:
+            raise fatal_error
+        if self.total and len(self.failed) == self.total:
+            raise RuntimeError(f"所有文件增广均失败，首个错误: {self.failed[0]['error']}")
+        return self.stats()
+
+def collect_markdown_files(path, exclude_dirs=()):
+    """收集需要增广的md文件，跳过exclude_dirs中的目录"""
+    if os.path.isfile(path):
+        return [path] if path.lower().endswith('.md') else []
+    excluded = [os.path.abspath(d) for d in exclude_dirs]
+    files = []
+    for root, dirs, names in os.walk(path):
+        if any(os.path.abspath(root).startswith(d) for d in excluded):
+            dirs[:] = []
+            continue
+        for name in sorted(names):
+            if name.lower().endswith('.md'):
+                files.append(os.path.join(root, name))
+    return files
+
+# ==================== 增量处理 ====================
+def file_sha256(path, chunk_size=1 << 20):
+    """计算文件内容的SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def fingerprint_files(files, root, previous=None):
+    """计算文件指纹 {相对路径: {'hash', 'size', 'mtime'}}
+
+    size和mtime与上次记录一致时直接复用记录中的哈希，避免重复读取未变化的文件。
+    """
+    previous = previous or {}
+    fingerprints = {}
+    for path in files:
+        rel_path = os.path.relpath(path, root).replace(os.sep, '/')
+        stat = os.stat(path)
+        old = previous.get(rel_path)
+        if old and old.get('size') == stat.st_size and old.get('mtime') == stat.st_mtime:
+            file_hash = old['hash']
+        else:
+            file_hash = file_sha256(path)
+        fingerprints[rel_path] = {'hash': file_hash, 'size': stat.st_size, 'mtime': stat.st_mtime}
+    return fingerprints
+
+def combined_fingerprint(fingerprints):
+    """将一组文件指纹合并为一个哈希，用于判断整体输入是否变化"""
+    digest = hashlib.sha256()
+    for rel_path in sorted(fingerprints):
+        digest.update(f"{rel_path}\0{fingerprints[rel_path]['hash']}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+def _changed_files(files, root, current, previous):
+    """找出内容与上次记录不同（或新增）的文件"""
+    changed = []
+    for path in files:
+        rel_path = os.path.relpath(path, root).replace(os.sep, '/')
+        if previous.get(rel_path, {}).get('hash') != current[rel_path]['hash']:
+            changed.append(path)
+    return changed
+
+def _remove_outputs(output_path, rel_paths):
+    """删除输出目录中的产物文件，并清理因此变空的子目录"""
+    output_root = os.path.abspath(output_path)
+    removed = 0
+    for rel_path in rel_paths:
+        path = os.path.abspath(os.path.join(output_root, rel_path))
+        # 只删除输出目录内的文件，防止state.json被改写后误删其他文件
+        if not path.startswith(output_root + os.sep) or not os.path.isfile(path):
+            continue
+        os.remove(path)
+        removed += 1
+        parent = os.path.dirname(path)
+        while parent != output_root and not os.listdir(parent):
+            os.rmdir(parent)
+            parent = os.path.dirname(parent)
+    return removed
+
+def incremental_preprocess(input_path, output_path, state, workers=None, job_id=None, progress_range=(0, 100),
+                           parallel=True):
+    """只预处理内容发生变化的输入文件，并把文件指纹和每个输入的输出文件记录到state中
+
+    已删除（或改名）的输入文件，以及重新处理后不再生成的旧输出，会从输出目录中删除，
+    避免后续的增广和知识树继续使用它们。parallel为False时在当前进程中逐个处理。
+    """
+    incremental = state.setdefault('incremental', {})
+    previous = incremental.get('preprocess', {})
+    previous_outputs = incremental.get('preprocess_outputs', {})
+    input_root = input_path if os.path.isdir(input_path) else os.path.dirname(input_path)
+    to_rel = lambda path, root: os.path.relpath(path, root).replace(os.sep, '/')
+    
+    files = collect_preprocess_files(input_path, output_path)
+    current = fingerprint_files(files, input_root, previous)
+    todo = _changed_files(files, input_root, current, previous)
+    # 记录的输出已不在磁盘上（如被误删）时同样重新处理
+    todo += [path for path in files if path not in todo and any(
+        not os.path.exists(os.path.join(output_path, out)) for out in previous_outputs.get(to_rel(path, input_root), []))]
+    print(f"📋 增量预处理: 共 {len(files)} 个文件，{len(todo)} 个需要处理")
+    
+    stats = {'total': len(files), 'skipped': len(files) - len(todo), 'succeeded': 0, 'failed': [], 'removed': 0}
+    outputs = {k: v for k, v in previous_outputs.items() if k in current}
+    stale = [path for k, paths in previous_outputs.items() if k not in current for path in paths]
+    if todo:
+        processed = preprocess_folder_parallel(input_path, output_path, workers=workers, job_id=job_id,
+                                               progress_range=progress_range, files=todo, in_process=not parallel)
+        stats.update(succeeded=processed['succeeded'], failed=processed['failed'])
+        for file_path, file_outputs in processed['outputs'].items():
+            rel_path = to_rel(file_path, input_root)
+            new_outputs = [to_rel(path, output_path) for path in file_outputs]
+            stale.extend(set(outputs.get(rel_path, [])) - set(new_outputs))
+            outputs[rel_path] = new_outputs
+    
+    # 仍被其他输入（如同名不同扩展名的a.pdf与a.docx）记录的输出不删除
+    claimed = {path for paths in outputs.values() for path in paths}
+    stale = sorted(set(stale) - claimed)
+    if stale:
+        stats['removed'] = _remove_outputs(output_path, stale)
+        print(f"🧹 删除了 {stats['removed']} 个已失效的预处理输出")
+    
+    # 失败的文件不记录指纹，下次运行时会重试
+    failed = {to_rel(f['file'], input_root) for f in stats['failed']}
+    incremental['preprocess'] = {k: v for k, v in current.items() if k not in failed}
+    incremental['preprocess_outputs'] = outputs
+    return stats
+
+def incremental_augment(processed_path, state, exclude_dirs=(), concurrency=None, job_id=None, progress_range=(0, 100)):
+    """只增广内容发生变化的md文件
+
+    增广可能原地改写文件或生成新的md文件：处理后的文件重新记录指纹，
+    新生成的文件记为本步骤的产物，之后不再作为增广输入。
+    """
+    incremental = state.setdefault('incremental', {})
+    previous = incremental.get('augment', {})
+    root = processed_path if os.path.isdir(processed_path) else os.path.dirname(processed_path)
+    # 已被删除的产物（如其来源的预处理输出已清理）不再记录
+    artifacts = {a for a in incremental.get('augment_artifacts', []) if os.path.exists(os.path.join(root, a))}
+    to_rel = lambda path: os.path.relpath(path, root).replace(os.sep, '/')
+    
+    before = collect_markdown_files(processed_path, exclude_dirs)
+    files = [f for f in before if to_rel(f) not in artifacts]
+    current = fingerprint_files(files, root, previous)
+    todo = _changed_files(files, root, current, previous)
+    print(f"📋 增量增广: 共 {len(files)} 个文件，{len(todo)} 个需要处理")
+    
+    stats = {'total': len(files), 'skipped': len(files) - len(todo), 'failed': []}
+    if todo:
+        scheduler = AugmentScheduler(model_config['model_provider'], concurrency=concurrency,
+                                     job_id=job_id, progress_range=progress_range)
+        stats.update(scheduler.run(todo))
+        stats['total'] = len(files)
+    
+    new_files = set(collect_markdown_files(processed_path, exclude_dirs)) - set(before)
+    artifacts |= {to_rel(f) for f in new_files}
+    failed = {to_rel(f['file']) for f in stats['failed']}
+    after = fingerprint_files([f for f in files if to_rel(f) not in failed], root, current)
+    incremental['augment'] = after
+    incremental['augment_artifacts'] = sorted(artifacts)
+    return stats
+
+def tree_input_fingerprint(processed_path, exclude_dirs=(), previous=None):
+    """知识树输入（全部md文件）的整体指纹，previous为可复用的文件指纹记录"""
+    root = processed_path if os.path.isdir(processed_path) else os.path.dirname(processed_path)
+    files = collect_markdown_files(processed_path, exclude_dirs)
+    return combined_fingerprint(fingerprint_files(files, root, previous))
+
+class PipelineError(Exception):
+    """流程中可预期的错误（如输入校验失败），携带返回给前端的错误信息和状态码"""
+    def __init__(self, error_response, status_code=400):
+        super().__init__(error_response.get('error', ''))
+        self.error_response = error_response
+        self.status_code = status_code
+    
+    def __reduce__(self):
+        # 从worker进程传回时按原参数重建
+        return (PipelineError, (self.error_response, self.status_code))
+
+def _pipeline_input_error(message):
+    """构造输入校验失败的PipelineError"""
+    error_response = handle_api_error(Exception(message), "验证文件类型")
+    error_response['error'] = message
+    return PipelineError(error_response, 400)
+
+def _contains_md_files(folder):
+    """检查目录中是否有md文件"""
+    for root, dirs, files in os.walk(folder):
+        for file in files:
+            if file.lower().endswith('.md'):
+                return True
+    return False
+
+def validate_pipeline_input(input_path, selected_steps):
+    """验证流程输入，不合法时抛出PipelineError"""
+    # 验证输入路径
+    if not input_path or not os.path.exists(input_path):
+        error_response = handle_api_error(Exception('输入路径不存在'), "验证输入路径")
+        error_response['error'] = '输入路径不存在'
+        raise PipelineError(error_response, 400)
+    
+    # 检查输入文件类型（如果只选择后面的步骤）
+    if not 'preprocess' in selected_steps and ('augment' in selected_steps or 'tree' in selected_steps):
+        # 检查输入是否为md文件
+        if os.path.isfile(input_path):
+            if not input_path.lower().endswith('.md'):
+                raise _pipeline_input_error('跳过预处理步骤时，输入必须是.md文件')
+        elif not _contains_md_files(input_path):
+            raise _pipeline_input_error('跳过预处理步骤时，输入目录必须包含.md文件')
+
+def execute_pipeline(input_path, output_path, selected_steps, job_id=None,
+                     parallel_preprocess=False, preprocess_workers=None,
+                     concurrent_augment=False, augment_concurrency=None, incremental=False, profile=False):
+    """依次执行选中的流程步骤（预处理 → 增广 → 构建知识树），返回执行结果
+
+    job_id不为空时，进度同时写入该任务的进度通道；
+    parallel_preprocess为True时，预处理按文件分发到进程池并行执行；
+    concurrent_augment为True时，增广按文件并发请求模型，并发数受服务商上限约束；
+    incremental为True时，根据state.json中记录的文件哈希只处理发生变化的文件；
+    profile为True时剖析每个步骤，结果写在state.json旁边
+    """
+    validate_pipeline_input(input_path, selected_steps)
+    
+    # 创建输出目录
+    os.makedirs(output_path, exist_ok=True)
+    
+    # 状态文件路径
+    state_path = os.path.join(output_path, 'state.json')
+    
+    # 加载状态
+    state = {}
+    if os.path.exists(state_path):
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except Exception as e:
+            print(f"⚠️ 状态文件加载失败: {str(e)}")
+            state = {}
+    
+    # 定义步骤
+    step_names = {
+        'preprocess': "预处理原始文件",
+        'augment': "增广文本", 
+        'tree': "构建知识树结构"
+    }
+    
+    sparklearn_dir = os.path.join(os.path.dirname(__file__), 'submodule', 'SparkLearn')
+    # 各步骤从SparkLearn的main模块调用大模型，先挂载LLM缓存钩子
+    install_llm_cache_hooks()
+    
+    # 如果跳过了预处理，直接使用输入路径
+    if 'preprocess' in selected_steps:
+        processed_path = output_path
+    else:
+        processed_path = input_path
+    
+    # 执行选中的步骤
+    total_steps = len(selected_steps)
+    completed_steps = 0
+    result = {'success': True, 'message': '流程执行完成'}
+    
+    for step in ['preprocess', 'augment', 'tree']:
+        if step not in selected_steps:
+            continue
+        
+        # 检查状态，如果已完成则询问是否继续执行
+        if state.get(step, False) and not incremental:
+            print(f"⚠️ 步骤 {step_names[step]} 已完成，继续执行将覆盖之前的结果")
+            # 这里可以选择继续执行，因为用户已经明确选择了这个步骤
+        
+        # 更新进度
+        step_percentage = int((completed_steps / total_steps) * 100)
+        update_progress(f"🔧 {step_names[step]}...", step_percentage, f"正在执行第{completed_steps + 1}/{total_steps}个步骤", job_id=job_id)
+        print(f"⏳ 正在执行: {step_names[step]}...")
+        
+        # 额外检查：确保tree步骤的输入只包含.md文件
+        if step == 'tree' and 'preprocess' not in selected_steps:
+            if os.path.isdir(processed_path) and not _contains_md_files(processed_path):
+                raise _pipeline_input_error('tree步骤需要.md文件作为输入，请先运行预处理步骤')
+        
+        tree_output = os.path.join(output_path, "tree")
+        graph_dir = os.path.join(tree_output, "graph")
+        step_progress_range = (step_percentage, int(((completed_steps + 1) / total_steps) * 100))
+        
+        # 增量模式下，md输入没有变化且图谱已存在时跳过构建
+        if step == 'tree' and incremental:
+            tree_fingerprint = tree_input_fingerprint(processed_path, [tree_output],
+                                                      previous=state.get('incremental', {}).get('augment'))
+            if state.get('incremental', {}).get('tree_fingerprint') == tree_fingerprint and os.path.exists(graph_dir):
+                completed_steps += 1
+                update_progress(f"✅ {step_names[step]}无变化，已跳过", int((completed_steps / total_steps) * 100),
+                                f"已完成第{completed_steps}/{total_steps}个步骤", job_id=job_id)
+                result['tree'] = {'skipped': True}
+                continue
+        
+        # 保存当前工作目录
+        original_cwd = os.getcwd()
+        stage_started = time.perf_counter()
+        stage_status = 'error'
+        stage_profile = Profiler(output_path, step).start() if profile else None
+        
+        try:
+            # 切换到SparkLearn目录
+            os.chdir(sparklearn_dir)
+            
+            if step == 'preprocess' and incremental:
+                result['preprocess'] = incremental_preprocess(input_path, output_path, state, workers=preprocess_workers,
+                                                              job_id=job_id, progress_range=step_progress_range,
+                                                              parallel=parallel_preprocess)
+                state['preprocess_failures'] = result['preprocess']['failed']
+            
+            elif step == 'preprocess' and parallel_preprocess:
+                preprocess_stats = preprocess_folder_parallel(
+                    input_path, output_path, workers=preprocess_workers,
+                    job_id=job_id, progress_range=step_progress_range)
+                preprocess_stats.pop('outputs')
+                result['preprocess'] = preprocess_stats
+                state['preprocess_failures'] = preprocess_stats['failed']
+            
+            elif step == 'preprocess':
+                from main import process_folder
+                process_folder(input_path, output_path)
+            
+            elif step == 'augment' and incremental:
+                concurrency = augment_concurrency if concurrent_augment else 1
+                result['augment'] = incremental_augment(processed_path, state, exclude_dirs=[tree_output],
+                                                        concurrency=concurrency, job_id=job_id,
+                                                        progress_range=step_progress_range)
+                state['augment_failures'] = result['augment']['failed']
+            
+            elif step == 'augment' and concurrent_augment:
+                scheduler = AugmentScheduler(model_config['model_provider'], concurrency=augment_concurrency,
+                                             job_id=job_id, progress_range=step_progress_range)
+                result['augment'] = scheduler.run(collect_markdown_files(processed_path, [tree_output]))
+                state['augment_failures'] = result['augment']['failed']
+            
+            elif step == 'augment': # 隐患：如果选择的输出文件夹不是空的，可能会出现问题
+                from main import augment_folder
+                augment_folder(processed_path)
+            
+            elif step == 'tree':
+                from main import tree_folder
+                # 确保tree_output目录存在
+                os.makedirs(tree_output, exist_ok=True)
                 
-                print(f"✅ 完成: {step_names[step]}")
-        
-        print("🎉 全部流程完成！")
-        # 更新最终进度状态
-        update_progress("✅ 全部流程完成", 100, "处理完成")
-        return jsonify({'success': True, 'message': '流程执行完成'})
-        
+                # 更新环境变量，确保使用处理后的md文件路径
+                os.environ['raw_path'] = processed_path
+                tree_folder(processed_path, tree_output)
+                invalidate_kg_cache(graph_dir)
+                if incremental:
+                    state.setdefault('incremental', {})['tree_fingerprint'] = tree_fingerprint
+            
+            # 更新进度
+            stage_status = 'ok'
+            completed_steps += 1
+            step_percentage = int((completed_steps / total_steps) * 100)
+            update_progress(f"✅ {step_names[step]}完成", step_percentage, f"已完成第{completed_steps}/{total_steps}个步骤", job_id=job_id)
+        finally:
+            # 恢复原始工作目录
+            os.chdir(original_cwd)
+            if stage_profile is not None:
+                stage_profile.finish()
+            record_metric('observe', 'sparklearn_pipeline_stage_duration_seconds', time.perf_counter() - stage_started,
+                          stage=step, status=stage_status)
+        
+        if step == 'tree':
+            # 生成知识图谱可视化
+            if os.path.exists(graph_dir):
+                kg = kg_cache.get(graph_dir)
+                print(f"知识图谱已构建在: {graph_dir}")
+                # graph.png不在这里生成，见request_graph_render
+                # 预先计算布局并生成前端所需的压缩图谱数据，预览页只需绘制
+                update_progress("🔧 计算图谱布局...", 100 * completed_steps // total_steps, "生成节点坐标", job_id=job_id)
+                layout_started = time.perf_counter()
+                with profile_section(profile, output_path, 'layout'):
+                    write_graph_payload(graph_dir, kg)
+                record_metric('observe', 'sparklearn_pipeline_stage_duration_seconds',
+                              time.perf_counter() - layout_started, stage='layout', status='ok')
+        
+        # 更新状态
+        state[step] = True
+        with open(state_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+        
+        print(f"✅ 完成: {step_names[step]}")
+    
+    print("🎉 全部流程完成！")
+    # 更新最终进度状态
+    update_progress("✅ 全部流程完成", 100, "处理完成", job_id=job_id)
+    return result
+
+def _parse_pipeline_request(data):
+    """从请求体中解析流程参数"""
+    return {
+        'input_path': data.get('input_path', ''),
+        'output_path': data.get('output_path', './outputs'),
+        'selected_steps': data.get('steps', ['preprocess', 'augment', 'tree']),
+        'parallel_preprocess': bool(data.get('parallel_preprocess', os.environ.get('PARALLEL_PREPROCESS') == '1')),
+        'preprocess_workers': data.get('preprocess_workers'),
+        'concurrent_augment': bool(data.get('concurrent_augment', os.environ.get('CONCURRENT_AUGMENT') == '1')),
+        'augment_concurrency': data.get('augment_concurrency'),
+        'incremental': bool(data.get('incremental', False)),
+        'profile': bool(data.get('profile', False))
+    }
+
+@app.route('/api/runPipeline', methods=['POST'])
+def api_run_pipeline():
+    """运行完整的处理流程（在请求线程中同步执行，长任务请使用/api/submitPipeline）"""
+    try:
+        params = _parse_pipeline_request(request.json)
+        return jsonify(run_pipeline_isolated(params))
+    
+    except PipelineError as e:
+        return jsonify(e.error_response), e.status_code
     except Exception as e:
         logger.error(f"运行流程失败: {str(e)}")
         logger.error(traceback.format_exc())
@@ -628,6 +2411,346 @@ def api_run_pipeline():
         error_response = handle_api_error(e, "运行流程")
         return jsonify(error_response), 500
 
+# ==================== 隔离的worker进程 ====================
+# process：每个流程任务在独立的子进程中运行，os.chdir和环境变量的修改互不影响；
+# thread：在服务进程内运行（旧行为，同一时间只能安全运行一个流程）
+PIPELINE_ISOLATION = os.environ.get('PIPELINE_ISOLATION', 'process')
+
+_worker_pool = None
+_worker_pool_lock = threading.Lock()
+_progress_manager = None
+_progress_relay_queue = None
+_shared_provider_semaphores = {}
+
+def _relay_worker_progress(queue):
+    """把worker进程上报的进度写入服务进程中的进度通道，指标、LLM缓存统计和图谱缓存失效通知应用到服务进程"""
+    while True:
+        try:
+            item = queue.get()
+        except (EOFError, OSError):
+            return
+        if item[0] == 'metric':
+            _, kind, name, value, labels = item
+            record_metric(kind, name, value, **labels)
+            continue
+        if item[0] == 'llm_cache_stats':
+            llm_cache.merge_stats(item[1])
+            continue
+        if item[0] == 'kg_invalidate':
+            kg_cache.invalidate(item[1])
+            continue
+        step, percentage, message, job_id = item
+        update_progress(step, percentage, message, job_id=job_id)
+
+def _get_worker_pool():
+    """懒加载worker进程池和进度转发队列"""
+    global _worker_pool, _progress_manager, _progress_relay_queue
+    with _worker_pool_lock:
+        if _worker_pool is None:
+            # 服务进程是多线程的，使用spawn避免fork继承其他线程持有的锁
+            ctx = multiprocessing.get_context('spawn')
+            _progress_manager = ctx.Manager()
+            _progress_relay_queue = _progress_manager.Queue()
+            # 增广的服务商并发上限在所有worker进程间共享
+            for provider in AUGMENT_PROVIDER_CONCURRENCY:
+                _shared_provider_semaphores[provider] = _progress_manager.BoundedSemaphore(
+                    get_provider_concurrency(provider))
+            # 服务进程中的出题也使用同一组信号量，与worker中的增广共享配额
+            with AugmentScheduler._semaphores_lock:
+                AugmentScheduler._provider_semaphores.update(_shared_provider_semaphores)
+            threading.Thread(target=_relay_worker_progress, args=(_progress_relay_queue,),
+                             name='progress-relay', daemon=True).start()
+            # 每个子进程只运行一个任务，submodule中导入时读取的配置和全局状态不会残留到下一个任务
+            _worker_pool = ProcessPoolExecutor(max_workers=PIPELINE_WORKERS, mp_context=ctx, max_tasks_per_child=1)
+        return _worker_pool, _progress_relay_queue
+
+def _config_snapshot():
+    """当前的API和模型配置，以及共享的服务商并发信号量，传给worker进程"""
+    return {
+        'api_config': dict(api_config),
+        'model_config': dict(model_config),
+        'provider_semaphores': dict(_shared_provider_semaphores)
+    }
+
+def _init_worker_context(config_snapshot, progress_queue):
+    """在worker进程中应用配置快照，并把进度转发回服务进程"""
+    global _worker_progress_queue
+    _worker_progress_queue = progress_queue
+    api_config.update(config_snapshot['api_config'])
+    model_config.update(config_snapshot['model_config'])
+    AugmentScheduler._provider_semaphores.update(config_snapshot['provider_semaphores'])
+    for key, value in {**config_snapshot['api_config'], **config_snapshot['model_config']}.items():
+        if isinstance(value, str) and value:
+            os.environ[key] = value
+
+def _flush_worker_stats(llm_stats_before):
+    """把本次任务中LLM缓存统计的增量发回服务进程（worker进程在任务结束后退出，统计不会保留）"""
+    delta = {key: value - llm_stats_before.get(key, 0) for key, value in llm_cache.stats.items()}
+    if any(delta.values()):
+        _worker_progress_queue.put(('llm_cache_stats', delta))
+
+def _execute_pipeline_in_worker(params, job_id, config_snapshot, progress_queue):
+    """worker进程入口：运行一个完整的流程"""
+    _init_worker_context(config_snapshot, progress_queue)
+    llm_stats_before = dict(llm_cache.stats)
+    try:
+        return execute_pipeline(**params, job_id=job_id)
+    finally:
+        _flush_worker_stats(llm_stats_before)
+
+def _build_knowledge_graph_in_worker(input_path, output_path, config_snapshot, progress_queue):
+    """worker进程入口：运行kg_construction构建知识图谱"""
+    _init_worker_context(config_snapshot, progress_queue)
+    # 设置环境变量
+    os.environ['meta_path'] = output_path
+    os.environ['raw_path'] = input_path
+    
+    # 导入并运行知识图谱构建
+    llm_stats_before = dict(llm_cache.stats)
+    try:
+        install_llm_cache_hooks()
+        from kg_construction.main import main
+        main()
+    finally:
+        _flush_worker_stats(llm_stats_before)
+
+def run_in_worker(func, *args):
+    """在隔离的worker进程中运行func(*args, config_snapshot, progress_queue)并等待结果"""
+    pool, progress_queue = _get_worker_pool()
+    return pool.submit(func, *args, _config_snapshot(), progress_queue).result()
+
+def run_pipeline_isolated(params, job_id=None):
+    """按PIPELINE_ISOLATION的设置运行流程"""
+    if PIPELINE_ISOLATION == 'process':
+        result = run_in_worker(_execute_pipeline_in_worker, params, job_id)
+    else:
+        result = execute_pipeline(**params, job_id=job_id)
+    
+    # 在本进程的渲染队列中生成图片，worker进程结束后不会保留后台线程
+    graph_dir = os.path.join(params['output_path'], 'tree', 'graph')
+    if GRAPH_RENDER_MODE == 'background' and 'tree' in params['selected_steps'] and os.path.isdir(graph_dir):
+        request_graph_render(graph_dir)
+    return result
+
+# ==================== 异步任务队列 ====================
+# 同时运行的流程数。各步骤会切换工作目录（os.chdir），只有在worker进程中隔离运行时才能并行
+PIPELINE_WORKERS = int(os.environ.get(
+    'PIPELINE_WORKERS',
+    str(min(4, os.cpu_count() or 1)) if os.environ.get('PIPELINE_ISOLATION', 'process') == 'process' else '1'
+))
+# 内存中最多保留的已结束任务数
+MAX_FINISHED_JOBS = int(os.environ.get('MAX_FINISHED_JOBS', '200'))
+
+pipeline_executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix='pipeline-worker')
+pipeline_jobs = {}
+pipeline_jobs_lock = threading.Lock()
+
+JOB_FINISHED_STATUSES = ('succeeded', 'failed', 'cancelled')
+
+def _job_snapshot(job, include_result=False):
+    """生成可序列化的任务信息"""
+    snapshot = {k: v for k, v in job.items() if k not in ('future', 'result', 'error')}
+    if include_result:
+        snapshot['result'] = job['result']
+        snapshot['error'] = job['error']
+    return snapshot
+
+def _prune_finished_jobs():
+    """清理最早结束的任务，避免任务表无限增长（调用方需持有锁）"""
+    finished = [j for j in pipeline_jobs.values() if j['status'] in JOB_FINISHED_STATUSES]
+    if len(finished) <= MAX_FINISHED_JOBS:
+        return
+    finished.sort(key=lambda j: j['finished_at'] or '')
+    for job in finished[:len(finished) - MAX_FINISHED_JOBS]:
+        pipeline_jobs.pop(job['job_id'], None)
+        with progress_channels_lock:
+            progress_channels.pop(job['job_id'], None)
+
+def _run_pipeline_job(job_id):
+    """在worker线程中执行一个排队的流程任务"""
+    with pipeline_jobs_lock:
+        job = pipeline_jobs.get(job_id)
+        if job is None or job['status'] != 'queued':
+            return
+        job['status'] = 'running'
+        job['started_at'] = datetime.now().isoformat()
+        params = dict(job['params'])
+    
+    channel = get_progress_channel(job_id)
+    channel.publish(status='running')
+    status, result, error = 'succeeded', None, None
+    try:
+        result = run_pipeline_isolated(params, job_id=job_id)
+    except PipelineError as e:
+        status, error = 'failed', e.error_response
+    except Exception as e:
+        logger.error(f"任务 {job_id} 运行失败: {str(e)}")
+        logger.error(traceback.format_exc())
+        update_progress("❌ 流程执行失败", 0, f"错误: {str(e)}", job_id=job_id)
+        status, error = 'failed', handle_api_error(e, "运行流程")
+    
+    with pipeline_jobs_lock:
+        job.update({
+            'status': status,
+            'result': result,
+            'error': error,
+            'finished_at': datetime.now().isoformat()
+        })
+        _prune_finished_jobs()
+    channel.close(status)
+
+def submit_pipeline_job(params):
+    """创建流程任务并放入worker池，立即返回任务信息"""
+    job_id = uuid.uuid4().hex
+    job = {
+        'job_id': job_id,
+        'status': 'queued',
+        'params': params,
+        'created_at': datetime.now().isoformat(),
+        'started_at': None,
+        'finished_at': None,
+        'result': None,
+        'error': None,
+        'future': None
+    }
+    get_progress_channel(job_id, create=True)
+    with pipeline_jobs_lock:
+        pipeline_jobs[job_id] = job
+        job['future'] = pipeline_executor.submit(_run_pipeline_job, job_id)
+        return _job_snapshot(job)
+
+def _get_job_or_404(data):
+    """根据请求中的job_id查找任务，找不到时返回错误响应"""
+    job_id = (data or {}).get('job_id', '')
+    job = pipeline_jobs.get(job_id)
+    if job is None:
+        return None, (jsonify({'success': False, 'error': '任务不存在'}), 404)
+    return job, None
+
+@app.route('/api/submitPipeline', methods=['POST'])
+def api_submit_pipeline():
+    """提交处理流程任务，立即返回任务ID"""
+    try:
+        params = _parse_pipeline_request(request.json)
+        # 提交前先做输入校验，尽早返回明显的错误
+        validate_pipeline_input(params['input_path'], params['selected_steps'])
+        job = submit_pipeline_job(params)
+        return jsonify({'success': True, 'job_id': job['job_id'], 'job': job}), 202
+    except PipelineError as e:
+        return jsonify(e.error_response), e.status_code
+    except Exception as e:
+        logger.error(f"提交流程任务失败: {str(e)}")
+        return jsonify(handle_api_error(e, "提交流程任务")), 500
+
+@app.route('/api/getJobStatus', methods=['POST'])
+def api_get_job_status():
+    """获取任务状态"""
+    with pipeline_jobs_lock:
+        job, error = _get_job_or_404(request.json)
+        if error:
+            return error
+        snapshot = _job_snapshot(job)
+        if job['status'] == 'queued':
+            queued = sorted((j for j in pipeline_jobs.values() if j['status'] == 'queued'),
+                            key=lambda j: j['created_at'])
+            snapshot['queue_position'] = [j['job_id'] for j in queued].index(job['job_id']) + 1
+    return jsonify({'success': True, 'job': snapshot})
+
+@app.route('/api/getJobResult', methods=['POST'])
+def api_get_job_result():
+    """获取任务结果，任务未结束时返回409"""
+    with pipeline_jobs_lock:
+        job, error = _get_job_or_404(request.json)
+        if error:
+            return error
+        snapshot = _job_snapshot(job, include_result=True)
+    
+    if snapshot['status'] not in JOB_FINISHED_STATUSES:
+        return jsonify({'success': False, 'error': '任务尚未完成', 'job': snapshot}), 409
+    if snapshot['status'] == 'failed':
+        return jsonify({**snapshot['error'], 'job': snapshot}), 500
+    if snapshot['status'] == 'cancelled':
+        return jsonify({'success': False, 'error': '任务已取消', 'job': snapshot}), 410
+    return jsonify({**snapshot['result'], 'job': snapshot})
+
+@app.route('/api/listJobs', methods=['POST'])
+def api_list_jobs():
+    """列出所有任务"""
+    with pipeline_jobs_lock:
+        jobs = sorted((_job_snapshot(j) for j in pipeline_jobs.values()),
+                      key=lambda j: j['created_at'], reverse=True)
+    return jsonify({'success': True, 'jobs': jobs})
+
+@app.route('/api/cancelJob', methods=['POST'])
+def api_cancel_job():
+    """取消排队中的任务（正在运行的任务无法中断）"""
+    with pipeline_jobs_lock:
+        job, error = _get_job_or_404(request.json)
+        if error:
+            return error
+        if job['status'] != 'queued':
+            return jsonify({'success': False, 'error': '只能取消排队中的任务', 'job': _job_snapshot(job)}), 409
+        job['future'].cancel()
+        job['status'] = 'cancelled'
+        job['finished_at'] = datetime.now().isoformat()
+        snapshot = _job_snapshot(job)
+    channel = get_progress_channel(snapshot['job_id'])
+    if channel:
+        channel.close('cancelled')
+    return jsonify({'success': True, 'job': snapshot})
+
+# SSE心跳间隔（秒），避免代理因连接空闲而断开
+SSE_KEEPALIVE_SECONDS = 15
+
+def _sse_event(event, data, event_id=None):
+    """格式化一条SSE消息"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return '\n'.join(lines) + '\n\n'
+
+@app.route('/api/getJobProgress', methods=['POST'])
+def api_get_job_progress():
+    """获取任务的当前进度（不支持SSE的客户端使用）"""
+    job_id = (request.json or {}).get('job_id', '')
+    channel = get_progress_channel(job_id)
+    if channel is None:
+        return jsonify({'success': False, 'error': '任务不存在'}), 404
+    version, state, closed = channel.snapshot()
+    return jsonify({'success': True, 'version': version, 'progress': state})
+
+@app.route('/api/jobEvents/<job_id>', methods=['GET'])
+def api_job_events(job_id):
+    """以Server-Sent Events推送任务进度，仅在进度变化时发送"""
+    channel = get_progress_channel(job_id)
+    if channel is None:
+        return jsonify({'success': False, 'error': '任务不存在'}), 404
+
+    # 断线重连时浏览器会带上Last-Event-ID，已推送过的版本不再重复发送
+    try:
+        last_version = int(request.headers.get('Last-Event-ID', -1))
+    except ValueError:
+        last_version = -1
+
+    def stream(last_version):
+        while True:
+            version, state, closed = channel.wait_for_change(last_version, SSE_KEEPALIVE_SECONDS)
+            if closed:
+                yield _sse_event('done', state, version)
+                return
+            if version != last_version:
+                last_version = version
+                yield _sse_event('progress', state, version)
+            else:
+                yield ': keep-alive\n\n'
+
+    return Response(stream_with_context(stream(last_version)), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/api/loadState', methods=['POST'])
 def api_load_state():
     """加载状态文件"""
@@ -881,33 +3004,259 @@ def api_select_input():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# ==================== 目录列表 ====================
+LIST_DIRECTORY_PAGE_SIZE = 500
+LIST_DIRECTORY_MAX_PAGE_SIZE = 5000
+LIST_DIRECTORY_SORT_FIELDS = ('name', 'size', 'mtime', 'type')
+
+def _directory_sort_key(entry, sort, stat_result):
+    """目录项的排序键，名字排序时目录排在文件前面；名字作为相同值时的次序"""
+    if sort == 'size':
+        value = stat_result.st_size if stat_result else -1
+    elif sort == 'mtime':
+        value = stat_result.st_mtime_ns if stat_result else -1
+    elif sort == 'type':
+        value = '' if entry.is_dir() else os.path.splitext(entry.name)[1].lower()
+    else:
+        value = 0 if entry.is_dir() else 1
+    return (value, entry.name.lower(), entry.name)
+
+def _encode_list_cursor(sort, order, key):
+    raw = json.dumps({'sort': sort, 'order': order, 'key': list(key)}, ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def _decode_list_cursor(cursor, sort, order):
+    """解析分页游标，格式不对或与当前排序方式不一致时抛出ValueError"""
+    if not isinstance(cursor, str):
+        raise ValueError('无效的分页游标')
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise ValueError('无效的分页游标')
+    if not isinstance(data, dict):
+        raise ValueError('无效的分页游标')
+    if data.get('sort') != sort or data.get('order') != order:
+        raise ValueError('分页游标与排序方式不一致')
+    
+    # 排序键为(值, 小写名字, 名字)，值按type排序时是扩展名，其余为整数；类型不符时无法与目录项比较
+    key = data.get('key')
+    value_type = str if sort == 'type' else int
+    if not (isinstance(key, list) and len(key) == 3
+            and isinstance(key[0], value_type) and not isinstance(key[0], bool)
+            and isinstance(key[1], str) and isinstance(key[2], str)):
+        raise ValueError('无效的分页游标')
+    return tuple(key)
+
+def list_directory_page(path, sort='name', order='asc', extensions=None, cursor=None,
+                        limit=LIST_DIRECTORY_PAGE_SIZE, include_stats=False):
+    """用一次scandir列出目录中的一页
+
+    目录/文件类型取自scandir自带的d_type，只有按大小、时间排序或需要返回大小、时间时才stat。
+    游标记录上一页最后一项的排序键，翻页期间目录有增删也不会重复或漏掉未变化的项。
+    extensions只过滤文件，子目录始终保留以便继续浏览。
+    """
+    need_stat_for_sort = sort in ('size', 'mtime')
+    entries = []
+    with os.scandir(path) as it:
+        for entry in it:
+            is_dir = entry.is_dir()
+            if extensions and not is_dir and os.path.splitext(entry.name)[1].lower() not in extensions:
+                continue
+            stat_result = None
+            if need_stat_for_sort:
+                try:
+                    stat_result = entry.stat()
+                except OSError:
+                    pass
+            entries.append((_directory_sort_key(entry, sort, stat_result), entry, stat_result))
+    
+    entries.sort(key=lambda item: item[0], reverse=(order == 'desc'))
+    
+    start = 0
+    if cursor:
+        cursor_key = _decode_list_cursor(cursor, sort, order)
+        keys = [item[0] for item in entries]
+        if order == 'desc':
+            # 倒序列表中找到第一个小于游标的位置
+            start = next((i for i, key in enumerate(keys) if key < cursor_key), len(keys))
+        else:
+            start = bisect.bisect_right(keys, cursor_key)
+    page = entries[start:start + limit]
+    
+    items = []
+    for key, entry, stat_result in page:
+        is_dir = entry.is_dir()
+        item = {
+            'name': entry.name,
+            'path': entry.path,
+            'is_dir': is_dir,
+            'is_file': entry.is_file()
+        }
+        if include_stats:
+            try:
+                stat_result = stat_result or entry.stat()
+                item['size'] = None if is_dir else stat_result.st_size
+                item['mtime'] = stat_result.st_mtime
+            except OSError:
+                item['size'] = None
+                item['mtime'] = None
+        items.append(item)
+    
+    next_cursor = None
+    if start + limit < len(entries) and page:
+        next_cursor = _encode_list_cursor(sort, order, page[-1][0])
+    return {'items': items, 'total': len(entries), 'has_more': next_cursor is not None, 'next_cursor': next_cursor}
+
 @app.route('/api/listDirectory', methods=['POST'])
 def api_list_directory():
-    """列出目录内容"""
+    """列出目录内容
+
+    支持分页（limit + cursor）、按name/size/mtime/type排序、按扩展名过滤，
+    include_stats为true时附带文件大小和修改时间。每页最多limit项（默认500），
+    has_more为true时需带上next_cursor继续请求，直到has_more为false。
+    """
     try:
-        data = request.json
+        data = request.json or {}
         path = data.get('path', '.')
         
         if not os.path.exists(path):
             return jsonify({'success': False, 'error': '路径不存在'}), 400
         
-        items = []
-        for item in os.listdir(path):
-            item_path = os.path.join(path, item)
-            items.append({
-                'name': item,
-                'path': item_path,
-                'is_dir': os.path.isdir(item_path),
-                'is_file': os.path.isfile(item_path)
-            })
-        
-        return jsonify({'success': True, 'items': items})
+        sort = data.get('sort', 'name')
+        if sort not in LIST_DIRECTORY_SORT_FIELDS:
+            return jsonify({'success': False, 'error': f'不支持的排序方式: {sort}'}), 400
+        order = 'desc' if data.get('order') == 'desc' else 'asc'
+        
+        extensions = data.get('extensions') or []
+        if isinstance(extensions, str):
+            extensions = [extensions]
+        if not isinstance(extensions, list) or not all(isinstance(ext, str) for ext in extensions):
+            return jsonify({'success': False, 'error': '扩展名列表必须是字符串数组'}), 400
+        extensions = {ext.lower() if ext.startswith('.') else f'.{ext.lower()}' for ext in extensions if ext}
+        
+        try:
+            page = list_directory_page(
+                path,
+                sort=sort,
+                order=order,
+                extensions=extensions,
+                cursor=data.get('cursor'),
+                limit=_bounded_int(data.get('limit'), LIST_DIRECTORY_PAGE_SIZE, 1, LIST_DIRECTORY_MAX_PAGE_SIZE),
+                include_stats=bool(data.get('include_stats', False))
+            )
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        return jsonify({'success': True, **page})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# ==================== 文件夹统计缓存 ====================
+FOLDER_STATS_CACHE_MAX_DIRS = int(os.environ.get('FOLDER_STATS_CACHE_MAX_DIRS', '200000'))
+FOLDER_SCAN_WORKERS = int(os.environ.get('FOLDER_SCAN_WORKERS', '8'))
+
+class FolderStatsCache:
+    """按目录缓存其直接包含的文件统计，以目录mtime判断是否需要重新扫描
+
+    重复统计同一文件夹时每个目录只需一次stat，只有增删过文件的目录才会重新scandir。
+    注意目录mtime只在子项增删、重命名时变化，原地改写文件内容不会使缓存失效。
+    """
+    def __init__(self, max_dirs):
+        self.max_dirs = max_dirs
+        self._entries = OrderedDict()  # {dir_path: {'mtime_ns', 'size', 'count', 'types', 'subdirs'}}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+    
+    @staticmethod
+    def _scan(path):
+        size, count, types, subdirs = 0, 0, set(), []
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.is_file():
+                        size += entry.stat().st_size
+                        count += 1
+                        file_ext = os.path.splitext(entry.name)[1].lower()
+                        types.add(file_ext[1:] if file_ext else 'unknown')
+                except OSError:
+                    # 跳过无法访问的文件
+                    continue
+        return {'size': size, 'count': count, 'types': types, 'subdirs': subdirs}
+    
+    def get_dir(self, path):
+        """返回单个目录（不含子目录）的统计"""
+        # 先取mtime再扫描，扫描期间发生的变化会在下次调用时被发现
+        mtime_ns = os.stat(path).st_mtime_ns
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry['mtime_ns'] == mtime_ns:
+                self._entries.move_to_end(path)
+                self.stats['hits'] += 1
+                return entry
+            self.stats['misses'] += 1
+        
+        entry = self._scan(path)
+        entry['mtime_ns'] = mtime_ns
+        with self._lock:
+            self._entries[path] = entry
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_dirs:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+        return entry
+    
+    def _collect_tree(self, root):
+        size, count, types = 0, 0, set()
+        stack = [root]
+        while stack:
+            try:
+                entry = self.get_dir(stack.pop())
+            except OSError:
+                continue
+            size += entry['size']
+            count += entry['count']
+            types |= entry['types']
+            stack.extend(entry['subdirs'])
+        return size, count, types
+    
+    def collect(self, folder_path, workers=1):
+        """汇总整个文件夹的统计，workers>1时并行遍历各个一级子目录"""
+        root = os.path.abspath(folder_path)
+        entry = self.get_dir(root)
+        size, count, types = entry['size'], entry['count'], set(entry['types'])
+        
+        if workers > 1 and len(entry['subdirs']) > 1:
+            with ThreadPoolExecutor(max_workers=min(workers, len(entry['subdirs']))) as pool:
+                parts = list(pool.map(self._collect_tree, entry['subdirs']))
+        else:
+            parts = [self._collect_tree(subdir) for subdir in entry['subdirs']]
+        
+        for part_size, part_count, part_types in parts:
+            size += part_size
+            count += part_count
+            types |= part_types
+        return {'totalSize': size, 'fileCount': count, 'fileTypes': sorted(types)}
+    
+    def get_stats(self):
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'hit_ratio': round(self.stats['hits'] / lookups, 4) if lookups else 0.0,
+                'dirs': len(self._entries),
+                'max_dirs': self.max_dirs
+            }
+
+folder_stats_cache = FolderStatsCache(FOLDER_STATS_CACHE_MAX_DIRS)
+
 @app.route('/api/getFolderInfo', methods=['POST'])
 def api_get_folder_info():
-    """获取文件夹信息"""
+    """获取文件夹信息
+
+    按目录mtime缓存统计结果，重复获取同一文件夹时只重新扫描有变化的目录。
+    """
     try:
         data = request.json
         folder_path = data.get('path', '')
@@ -921,36 +3270,11 @@ def api_get_folder_info():
         if not os.path.isdir(folder_path):
             return jsonify({'success': False, 'error': '路径不是文件夹'}), 400
         
-        total_size = 0
-        file_count = 0
-        file_types = set()
+        # parallel为true时并行遍历子目录，适合网络挂载的大目录
+        workers = FOLDER_SCAN_WORKERS if data.get('parallel', False) else 1
+        info = folder_stats_cache.collect(folder_path, workers=workers)
         
-        # 遍历文件夹中的所有文件
-        for root, dirs, files in os.walk(folder_path):
-            for file in files:
-                file_path = os.path.join(root, file)
-                try:
-                    # 获取文件大小
-                    file_size = os.path.getsize(file_path)
-                    total_size += file_size
-                    file_count += 1
-                    
-                    # 获取文件类型
-                    file_ext = os.path.splitext(file)[1].lower()
-                    if file_ext:
-                        file_types.add(file_ext[1:])  # 去掉点号
-                    else:
-                        file_types.add('unknown')
-                except (OSError, IOError):
-                    # 跳过无法访问的文件
-                    continue
-        
-        return jsonify({
-            'success': True,
-            'totalSize': total_size,
-            'fileCount': file_count,
-            'fileTypes': list(file_types)
-        })
+        return jsonify({'success': True, **info})
         
     except Exception as e:
         logger.error(f"获取文件夹信息失败: {str(e)}")
@@ -991,7 +3315,11 @@ def api_open_folder():
 
 @app.route('/api/getKnowledgeGraph', methods=['POST'])
 def api_get_knowledge_graph():
-    """获取知识图谱数据"""
+    """获取知识图谱数据
+
+    返回预计算的gzip响应体；请求带If-None-Match且图谱未变化时返回304。
+    profile为true时剖析图谱数据的加载（需要时包括布局计算和压缩）。
+    """
     try:
         data = request.json
         output_path = data.get('output_path', '')
@@ -1005,40 +3333,22 @@ def api_get_knowledge_graph():
         if not os.path.exists(graph_dir):
             return jsonify({'success': False, 'error': '知识图谱目录不存在'}), 404
         
-        kg = KnowledgeGraph()
-        kg.load_knowledge_graph(graph_dir)
+        etag = graph_etag(graph_dir)
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            with profile_section(data.get('profile', False), output_path, 'getKnowledgeGraph'):
+                etag, compressed = load_graph_payload(graph_dir)
+            if 'gzip' in request.headers.get('Accept-Encoding', ''):
+                response = Response(compressed, mimetype='application/json')
+                response.headers['Content-Encoding'] = 'gzip'
+                response.headers['Vary'] = 'Accept-Encoding'
+            else:
+                response = Response(gzip.decompress(compressed), mimetype='application/json')
         
-        #转换为前端需要的格式
-        nodes = []
-        links = []
-
-        # 遍历图的节点
-        for node_id in kg.graph.nodes:
-            node_data = kg.graph.nodes[node_id]
-            nodes.append({
-                'id': node_id,
-                'name': node_id,  # 或者从 node_data 中提取更友好的名称
-                'val': node_data.get('weight', 5)  # 如果节点有 weight 属性
-            })
-
-        # 遍历图的边
-        for source, target, edge_data in kg.graph.edges(data=True):
-            links.append({
-                'source': source,
-                'target': target,
-                'label': edge_data.get('type', '关系')
-            })
-        
-        graph_data = {
-            'nodes': nodes,
-            'links': links
-        }
-        
-        return jsonify({
-            'success': True, 
-            'data': graph_data,
-            'message': '知识图谱数据加载成功'
-        })
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
         
     except Exception as e:
         import traceback
@@ -1046,16 +3356,90 @@ def api_get_knowledge_graph():
         print(error_msg)
         return jsonify({'success': False, 'error': error_msg}), 500
 
+@app.route('/api/getGraphImage', methods=['GET'])
+def api_get_graph_image():
+    """获取知识图谱图片
+
+    首次请求或图谱内容变化后才渲染；以图谱内容哈希作为ETag。
+    """
+    try:
+        output_path = request.args.get('output_path', '')
+        if not output_path:
+            return jsonify({'success': False, 'error': '输出路径不能为空'}), 400
+        
+        graph_dir = os.path.join(output_path, "tree", "graph")
+        if not os.path.exists(graph_dir):
+            return jsonify({'success': False, 'error': '知识图谱目录不存在'}), 404
+        
+        image_path, content_hash = request_graph_render(graph_dir).result()
+        etag = content_hash[:32]
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            with open(image_path, 'rb') as f:
+                response = Response(f.read(), mimetype='image/png')
+        
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+        
+    except Exception as e:
+        logger.error(f"获取知识图谱图片失败: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/getProgress', methods=['GET'])
 def get_progress():
-    """获取当前进度"""
-    # 静默处理进度请求，不输出日志
+    """获取最近一次的全局进度（旧版轮询接口，按任务订阅请使用/api/jobEvents/<job_id>）"""
     return jsonify(progress_state)
 
 
     
-if __name__ == '__main__':
-    # 加载.env文件中的配置
+@app.route('/api/metrics', methods=['GET'])
+def api_metrics():
+    """Prometheus文本格式的运行指标"""
+    with pipeline_jobs_lock:
+        job_counts = {'queued': 0, 'running': 0}
+        for job in pipeline_jobs.values():
+            if job['status'] in job_counts:
+                job_counts[job['status']] += 1
+    
+    cache_stats = {
+        'llm': llm_cache.get_stats(),
+        'knowledge_graph': kg_cache.get_stats(),
+        'folder_stats': folder_stats_cache.get_stats()
+    }
+    extra = [
+        ('sparklearn_pipeline_jobs', 'gauge', '排队中和运行中的流程任务数',
+         [({'status': status}, count) for status, count in job_counts.items()]),
+        ('sparklearn_cache_hit_ratio', 'gauge', '各缓存的命中率',
+         [({'cache': name}, stats['hit_ratio']) for name, stats in cache_stats.items()]),
+        ('sparklearn_cache_lookups_total', 'counter', '各缓存的查询次数',
+         [({'cache': name, 'result': result}, stats[key])
+          for name, stats in cache_stats.items() for result, key in (('hit', 'hits'), ('miss', 'misses'))]),
+    ]
+    return Response(metrics.render(extra), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/health', methods=['GET'])
+def api_health():
+    """就绪探针：服务能处理请求即返回200，不触发任何重量级导入"""
+    return jsonify({
+        'status': 'ok',
+        'pid': os.getpid(),
+        'uptime_seconds': round(time.perf_counter() - _import_started, 3),
+        'import_seconds': import_report['backend_import_seconds']
+    })
+
+@app.route('/api/getImportReport', methods=['POST'])
+def api_get_import_report():
+    """获取启动耗时报告"""
+    return jsonify({'success': True, 'report': import_report})
+
+import_report['backend_import_seconds'] = round(time.perf_counter() - _import_started, 3)
+logger.info(f"后端模块导入耗时 {import_report['backend_import_seconds']:.2f}秒")
+
+def load_env_config():
+    """加载.env文件中的配置（每个进程只需在启动时调用一次）"""
     env_path = Path(__file__).parent / '.env'
     if env_path.exists():
         with open(env_path, 'r', encoding='utf-8') as f:
@@ -1065,6 +3449,10 @@ if __name__ == '__main__':
                     api_config[key] = value
                     os.environ[key] = value
     
+if __name__ == '__main__':
+    # 开发模式：Werkzeug单进程服务器+自动重载，生产环境请使用 python wsgi.py
+    load_env_config()
+    
     print("启动SparkLearn后端服务器...")
     print(f"Submodule路径: {submodule_path}")
     print(f"当前API配置: {api_config}")
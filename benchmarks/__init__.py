@@ -0,0 +1 @@
+"""SparkLearn-WebUI 性能基准测试，在仓库根目录以 python -m benchmarks.<模块名> 运行"""
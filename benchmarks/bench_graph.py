@@ -0,0 +1,201 @@
+"""
+知识图谱相关接口的基准测试
+
+按不同规模（默认1千到100万节点）生成合成知识图谱，分别测量：
+加载（KnowledgeGraph.load_knowledge_graph）、前端数据构建（build_graph_payload）、
+JSON序列化、gzip压缩、邻接索引构建、服务端布局、matplotlib可视化，
+以及 /api/getKnowledgeGraph 的冷/热/304请求，并记录内存
+（截至该规模的进程峰值；加--trace-memory时另记录每一步自身的峰值分配）。
+每项同时给出每节点耗时（微秒），便于看出哪一步在多大规模时不再线性增长。
+
+    python -m benchmarks.bench_graph --sizes 1000,10000,100000 --output bench_graph.json
+"""
+
+import argparse
+import gc
+import gzip
+import json
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.common import REPO_ROOT, environment_info, peak_rss_bytes, write_results
+
+DEFAULT_SIZES = '1000,10000,100000,1000000'
+EDGE_TYPES = ['包含', '前置', '相关', '应用', '举例']
+
+def generate_graph(num_nodes: int, avg_degree: int, seed: int):
+    """生成有少量枢纽概念的有向图（偏好连接），节点带weight，边带type"""
+    import networkx as nx
+    rng = random.Random(seed)
+    graph = nx.DiGraph()
+    # 每条边的两个端点都放进列表，按列表随机抽取即按度数成比例选择
+    endpoints = []
+    for i in range(num_nodes):
+        node = f"概念_{i:07d}"
+        graph.add_node(node, weight=rng.randint(1, 10))
+        if endpoints:
+            for _ in range(min(avg_degree, i)):
+                target = rng.choice(endpoints)
+                if target != node:
+                    graph.add_edge(node, target, type=rng.choice(EDGE_TYPES))
+                    endpoints.append(target)
+        endpoints.append(node)
+    return graph
+
+def save_graph(backend, kg, graph_dir: Path):
+    """用KnowledgeGraph.save_knowledge_graph（load_knowledge_graph的对应方法）写出与tree步骤相同的磁盘格式
+
+    写出后重新加载，核对节点数和边数；无法写出可被load_knowledge_graph读取的图谱时抛出异常，
+    不会悄悄跳过依赖磁盘的测量。
+    """
+    save = getattr(kg, 'save_knowledge_graph', None)
+    if not callable(save):
+        raise RuntimeError("KnowledgeGraph没有save_knowledge_graph方法，无法写出load_knowledge_graph可读取的图谱；"
+                           "可以加--no-disk只测量不依赖磁盘的各项")
+    graph_dir.mkdir(parents=True, exist_ok=True)
+    save(str(graph_dir))
+    
+    loaded = backend.sparklearn.KnowledgeGraph()
+    loaded.load_knowledge_graph(str(graph_dir))
+    expected = (kg.graph.number_of_nodes(), kg.graph.number_of_edges())
+    actual = (loaded.graph.number_of_nodes(), loaded.graph.number_of_edges())
+    if actual != expected:
+        raise RuntimeError(f"保存的图谱重新加载后不一致: 节点/边 {actual}，应为 {expected}")
+
+def measure(fn, num_nodes: int, trace_memory: bool):
+    """运行fn并计时；trace_memory为True时用tracemalloc记录峰值分配（计时会包含其开销）"""
+    gc.collect()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    stats = {
+        'seconds': round(seconds, 4),
+        'per_node_us': round(seconds / num_nodes * 1e6, 3) if num_nodes else None
+    }
+    if trace_memory:
+        stats['traced_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, stats
+
+def bench_size(backend, num_nodes: int, args, workdir: Path) -> dict:
+    """测量一个规模下的各项耗时"""
+    print(f"📐 {num_nodes}个节点: 生成图谱...")
+    graph, generate_stats = measure(lambda: generate_graph(num_nodes, args.avg_degree, args.seed), num_nodes, False)
+    result = {
+        'nodes': graph.number_of_nodes(),
+        'edges': graph.number_of_edges(),
+        'phases': {'generate': generate_stats}
+    }
+    phases = result['phases']
+    
+    kg = backend.sparklearn.KnowledgeGraph()
+    kg.graph = graph
+    
+    output_path = workdir / f"graph_{num_nodes}"
+    graph_dir = output_path / 'tree' / 'graph'
+    if not args.no_disk:
+        save_graph(backend, kg, graph_dir)
+        def load():
+            loaded = backend.sparklearn.KnowledgeGraph()
+            loaded.load_knowledge_graph(str(graph_dir))
+            return loaded
+        _, phases['load'] = measure(load, num_nodes, args.trace_memory)
+        result['disk_bytes'] = sum(f.stat().st_size for f in graph_dir.rglob('*') if f.is_file())
+    
+    payload, phases['build_payload'] = measure(lambda: backend.build_graph_payload(kg), num_nodes, args.trace_memory)
+    body, phases['json_dumps'] = measure(
+        lambda: json.dumps({'success': True, 'data': payload}, ensure_ascii=False).encode('utf-8'),
+        num_nodes, args.trace_memory)
+    compressed, phases['gzip'] = measure(lambda: gzip.compress(body, compresslevel=6, mtime=0),
+                                         num_nodes, args.trace_memory)
+    result['json_bytes'] = len(body)
+    result['gzip_bytes'] = len(compressed)
+    del payload, body, compressed
+    
+    _, phases['adjacency_index'] = measure(lambda: backend.GraphAdjacencyIndex(graph), num_nodes, args.trace_memory)
+    
+    if num_nodes <= args.max_layout_nodes:
+        print(f"📐 {num_nodes}个节点: 计算布局...")
+        _, phases['layout'] = measure(lambda: backend.compute_graph_layout(kg), num_nodes, args.trace_memory)
+    
+    if num_nodes <= args.max_visualize_nodes:
+        print(f"📐 {num_nodes}个节点: matplotlib可视化...")
+        image_path = workdir / f"graph_{num_nodes}.png"
+        _, phases['visualize'] = measure(lambda: kg.visualize(str(image_path)), num_nodes, args.trace_memory)
+    
+    if not args.no_disk:
+        # 经过Flask测试客户端请求接口：冷请求（加载+生成压缩数据，请求中不计算布局）、热请求、条件请求
+        client = backend.app.test_client()
+        body = {'output_path': str(output_path)}
+        headers = {'Accept-Encoding': 'gzip'}
+        backend.kg_cache.invalidate()
+        response, phases['endpoint_cold'] = measure(
+            lambda: client.post('/api/getKnowledgeGraph', json=body, headers=headers), num_nodes, False)
+        phases['endpoint_cold']['status_code'] = response.status_code
+        etag = response.headers.get('ETag')
+        response, phases['endpoint_warm'] = measure(
+            lambda: client.post('/api/getKnowledgeGraph', json=body, headers=headers), num_nodes, False)
+        phases['endpoint_warm']['status_code'] = response.status_code
+        if etag:
+            response, phases['endpoint_not_modified'] = measure(
+                lambda: client.post('/api/getKnowledgeGraph', json=body, headers={**headers, 'If-None-Match': etag}),
+                num_nodes, False)
+            phases['endpoint_not_modified']['status_code'] = response.status_code
+        backend.kg_cache.invalidate()
+    
+    # ru_maxrss是整个进程生命周期的高水位，从第二个规模起只反映已运行过的最大规模；
+    # 各规模自身的峰值请用--trace-memory记录的traced_peak_bytes
+    result['cumulative_peak_rss_bytes'] = peak_rss_bytes()
+    summary = '，'.join(f"{name} {stats['seconds']:.3f}秒" for name, stats in phases.items())
+    print(f"✅ {num_nodes}个节点: {summary}")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='知识图谱接口基准测试')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='节点数，逗号分隔')
+    parser.add_argument('--avg-degree', type=int, default=3, help='每个新节点连出的边数')
+    parser.add_argument('--max-layout-nodes', type=int, default=None,
+                        help='超过该节点数时跳过布局，默认与服务端GRAPH_LAYOUT_MAX_NODES一致')
+    parser.add_argument('--max-visualize-nodes', type=int, default=20000, help='超过该节点数时跳过可视化')
+    parser.add_argument('--trace-memory', action='store_true', help='用tracemalloc记录每一步的峰值分配')
+    parser.add_argument('--workdir', help='图谱输出目录，默认使用临时目录')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-disk', action='store_true',
+                        help='不写出图谱文件，跳过加载、磁盘大小和接口请求的测量')
+    parser.add_argument('--output', default='-', help="结果JSON路径，'-'表示标准输出")
+    args = parser.parse_args()
+    
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    
+    sys.path.insert(0, str(REPO_ROOT))
+    import backend_server
+    if args.max_layout_nodes is None:
+        args.max_layout_nodes = backend_server.GRAPH_LAYOUT_MAX_NODES
+    
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix='sparklearn_graph_bench_'))
+    workdir.mkdir(parents=True, exist_ok=True)
+    results = {
+        'benchmark': 'graph',
+        'environment': environment_info(),
+        'config': {**vars(args), 'sizes': sizes},
+        'sizes': []
+    }
+    try:
+        for num_nodes in sizes:
+            results['sizes'].append(bench_size(backend_server, num_nodes, args, workdir))
+            gc.collect()
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+    
+    write_results(results, args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+"""
+端到端流程基准测试
+
+生成合成语料（markdown、txt、带文本层的PDF、DOCX、PPTX），通过Flask测试客户端
+依次调用 /api/runPipeline 运行预处理、增广、构建知识树，LLM调用由本地桩替代。
+每个步骤单独计时，输出文件吞吐（files/s）、token吞吐（tokens/s）、内存和墙钟时间；
+内存为截至该步骤的进程峰值（cumulative_peak_rss_bytes），加--trace-memory时另记录每个步骤自身的峰值分配。
+
+    python -m benchmarks.bench_pipeline --files 20 --size-kb 8 --output bench_pipeline.json
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from benchmarks.common import (REPO_ROOT, StubLLM, environment_info, estimate_tokens,
+                               peak_rss_bytes, synthetic_text, write_results)
+
+CORPUS_FORMATS = ('md', 'txt', 'pdf', 'docx', 'pptx')
+PIPELINE_STEPS = ('preprocess', 'augment', 'tree')
+
+# ---------- 合成语料 ----------
+
+def write_markdown(path: Path, text: str):
+    path.write_text(f"# {path.stem}\n\n{text}\n", encoding='utf-8')
+
+def write_txt(path: Path, text: str):
+    path.write_text(text.replace('## ', ''), encoding='utf-8')
+
+def write_pdf(path: Path, text: str):
+    """用PyMuPDF生成带文本层的PDF（内置的china-s字体支持中文）"""
+    import fitz
+    doc = fitz.open()
+    lines = text.replace('## ', '').split('\n')
+    per_page = 40
+    for start in range(0, len(lines), per_page):
+        page = doc.new_page()
+        y = 60
+        for line in lines[start:start + per_page]:
+            # 每行最多约40个字，超出部分截断到下一行
+            for offset in range(0, max(len(line), 1), 40):
+                page.insert_text((50, y), line[offset:offset + 40], fontname='china-s', fontsize=11)
+                y += 16
+    doc.save(str(path))
+    doc.close()
+
+def write_docx(path: Path, text: str):
+    """直接写出最小的OOXML文档，不依赖python-docx"""
+    paragraphs = ''.join(
+        f'<w:p><w:r><w:t xml:space="preserve">{escape(line)}</w:t></w:r></w:p>'
+        for line in text.replace('## ', '').split('\n') if line
+    )
+    content_types = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/word/document.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+        '</Types>'
+    )
+    rels = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="word/document.xml"/>'
+        '</Relationships>'
+    )
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f'<w:body>{paragraphs}</w:body></w:document>'
+    )
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', content_types)
+        zf.writestr('_rels/.rels', rels)
+        zf.writestr('word/document.xml', document)
+
+def write_pptx(path: Path, text: str):
+    """用python-pptx生成幻灯片，每节一页"""
+    from pptx import Presentation
+    prs = Presentation()
+    layout = prs.slide_layouts[1]
+    sections = [s for s in text.split('## ') if s.strip()]
+    for section in sections:
+        title, _, body = section.partition('\n\n')
+        slide = prs.slides.add_slide(layout)
+        slide.shapes.title.text = title.strip()
+        slide.placeholders[1].text = body.strip()
+    prs.save(str(path))
+
+WRITERS = {
+    'md': write_markdown,
+    'txt': write_txt,
+    'pdf': write_pdf,
+    'docx': write_docx,
+    'pptx': write_pptx,
+}
+
+def generate_corpus(corpus_dir: Path, formats, files_per_format: int, size_kb: int, seed: int) -> dict:
+    """生成合成语料，返回每种格式的文件数和估计token数；缺少生成所需的库时跳过该格式"""
+    rng = random.Random(seed)
+    corpus_dir.mkdir(parents=True, exist_ok=True)
+    summary = {}
+    for fmt in formats:
+        files, tokens = 0, 0
+        try:
+            for i in range(files_per_format):
+                # 中文每字约3字节
+                text = synthetic_text(rng, size_kb * 1024 // 3)
+                WRITERS[fmt](corpus_dir / f"{fmt}_{i:04d}.{fmt}", text)
+                files += 1
+                tokens += estimate_tokens(text)
+        except ImportError as e:
+            print(f"⚠️  跳过{fmt}格式：{e}")
+            continue
+        summary[fmt] = {'files': files, 'tokens': tokens}
+    return summary
+
+def count_markdown(path: Path, exclude: Path) -> tuple:
+    """统计目录中的md文件数和token数（不含tree输出）"""
+    files, tokens = 0, 0
+    for md in path.rglob('*.md'):
+        if exclude in md.parents:
+            continue
+        files += 1
+        tokens += estimate_tokens(md.read_text(encoding='utf-8', errors='ignore'))
+    return files, tokens
+
+# ---------- 运行流程 ----------
+
+def run_step(client, step: str, input_path: Path, output_path: Path, options: dict) -> dict:
+    body = {
+        'input_path': str(input_path),
+        'output_path': str(output_path),
+        'steps': [step],
+        **options
+    }
+    start = time.perf_counter()
+    response = client.post('/api/runPipeline', json=body)
+    wall = time.perf_counter() - start
+    data = response.get_json(silent=True) or {}
+    return {
+        'status_code': response.status_code,
+        'success': response.status_code == 200 and data.get('success', False),
+        'error': data.get('error'),
+        'wall_seconds': round(wall, 3)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='SparkLearn流程端到端基准测试')
+    parser.add_argument('--formats', default=','.join(CORPUS_FORMATS), help='语料格式，逗号分隔')
+    parser.add_argument('--files', type=int, default=10, help='每种格式的文件数')
+    parser.add_argument('--size-kb', type=int, default=8, help='每个文件的大致大小（KB）')
+    parser.add_argument('--steps', default=','.join(PIPELINE_STEPS), help='运行的步骤，逗号分隔')
+    parser.add_argument('--provider', default='openai', choices=['openai', 'silicon', 'chatglm'],
+                        help='模型服务商（桩LLM替换其SDK调用）')
+    parser.add_argument('--llm-latency-ms', type=float, default=200, help='桩LLM每次调用的平均延迟')
+    parser.add_argument('--llm-jitter-ms', type=float, default=50, help='桩LLM延迟的随机抖动')
+    parser.add_argument('--llm-response-file', help='桩LLM返回内容所在的文件，默认回显提示词末尾')
+    parser.add_argument('--parallel-preprocess', action='store_true', help='启用并行预处理')
+    parser.add_argument('--concurrent-augment', action='store_true', help='启用并发增广')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='用tracemalloc记录每个步骤在本进程中的峰值分配（计时会包含其开销）')
+    parser.add_argument('--workdir', help='语料和输出目录，默认使用临时目录')
+    parser.add_argument('--keep', action='store_true', help='保留语料和输出')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='-', help="结果JSON路径，'-'表示标准输出")
+    args = parser.parse_args()
+    
+    formats = [f for f in args.formats.split(',') if f]
+    steps = [s for s in args.steps.split(',') if s]
+    for fmt in formats:
+        if fmt not in CORPUS_FORMATS:
+            parser.error(f'不支持的格式: {fmt}')
+    for step in steps:
+        if step not in PIPELINE_STEPS:
+            parser.error(f'不支持的步骤: {step}')
+    
+    # 桩LLM只替换本进程中的SDK，流程必须在本进程内运行；同时关闭LLM缓存，每次都经过桩
+    os.environ['PIPELINE_ISOLATION'] = 'inline'
+    os.environ['LLM_CACHE_ENABLED'] = '0'
+    os.environ['GRAPH_RENDER_MODE'] = 'lazy'
+    
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix='sparklearn_bench_'))
+    corpus_dir = workdir / 'corpus'
+    output_dir = workdir / 'output'
+    if output_dir.exists():
+        shutil.rmtree(output_dir)
+    
+    print(f"📝 生成合成语料到 {corpus_dir} ...")
+    corpus = generate_corpus(corpus_dir, formats, args.files, args.size_kb, args.seed)
+    
+    response_text = ''
+    if args.llm_response_file:
+        response_text = Path(args.llm_response_file).read_text(encoding='utf-8')
+    stub = StubLLM(args.llm_latency_ms, args.llm_jitter_ms, response_text, seed=args.seed).install()
+    
+    import_started = time.perf_counter()
+    sys.path.insert(0, str(REPO_ROOT))
+    import backend_server
+    import config
+    import_seconds = time.perf_counter() - import_started
+    
+    # 只在内存中切换服务商，不改写submodule的config.py
+    config.model_provider = args.provider
+    backend_server.model_config['model_provider'] = args.provider
+    for key in ('openai_api_key', 'silicon_api_key', 'glm_api_key'):
+        if not getattr(config, key, None):
+            setattr(config, key, 'stub-key')
+            backend_server.api_config[key] = 'stub-key'
+    
+    options = {
+        'parallel_preprocess': args.parallel_preprocess,
+        'concurrent_augment': args.concurrent_augment
+    }
+    client = backend_server.app.test_client()
+    tree_dir = output_dir / 'tree'
+    results = {
+        'benchmark': 'pipeline',
+        'environment': environment_info(),
+        'config': {**vars(args), 'formats': formats, 'steps': steps},
+        'corpus': corpus,
+        'backend_import_seconds': round(import_seconds, 3),
+        'stages': {}
+    }
+    
+    total_started = time.perf_counter()
+    input_files = sum(item['files'] for item in corpus.values())
+    input_tokens = sum(item['tokens'] for item in corpus.values())
+    if args.trace_memory:
+        tracemalloc.start()
+    for step in steps:
+        if step == 'preprocess':
+            step_input, files, tokens = corpus_dir, input_files, input_tokens
+        else:
+            # 预处理之后的步骤以输出目录中的md文件为输入；未运行预处理时直接使用md语料
+            step_input = output_dir if 'preprocess' in steps else corpus_dir
+            files, tokens = count_markdown(step_input, tree_dir)
+        
+        llm_before = stub.stats()
+        if args.trace_memory:
+            tracemalloc.reset_peak()
+            traced_before = tracemalloc.get_traced_memory()[0]
+        print(f"⏳ {step}: {files}个文件 ...")
+        stage = run_step(client, step, step_input, output_dir, options)
+        llm_after = stub.stats()
+        if args.trace_memory:
+            # 本步骤中相对开始时增加的最大分配量，只统计本进程的Python分配（不含预处理子进程）
+            stage['traced_peak_bytes'] = tracemalloc.get_traced_memory()[1] - traced_before
+        
+        wall = stage['wall_seconds']
+        stage.update({
+            'input_files': files,
+            'input_tokens': tokens,
+            'files_per_second': round(files / wall, 3) if wall else None,
+            'tokens_per_second': round(tokens / wall, 1) if wall else None,
+            'llm_calls': llm_after['calls'] - llm_before['calls'],
+            'llm_tokens': (llm_after['prompt_tokens'] + llm_after['completion_tokens']
+                           - llm_before['prompt_tokens'] - llm_before['completion_tokens']),
+            # ru_maxrss是整个进程生命周期的高水位，不是本步骤自己的峰值，按步骤比较请用traced_peak_bytes
+            'cumulative_peak_rss_bytes': peak_rss_bytes()
+        })
+        results['stages'][step] = stage
+        print(f"{'✅' if stage['success'] else '❌'} {step}: {wall:.2f}秒"
+              + (f"，{stage['error']}" if stage['error'] else ''))
+        if not stage['success']:
+            break
+    
+    if args.trace_memory:
+        tracemalloc.stop()
+    results['total_wall_seconds'] = round(time.perf_counter() - total_started, 3)
+    results['peak_rss_bytes'] = peak_rss_bytes()
+    results['llm'] = stub.stats()
+    stub.uninstall()
+    
+    write_results(results, args.output)
+    if args.workdir is None and not args.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    if not all(stage['success'] for stage in results['stages'].values()):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""
+基准测试的公共工具：合成文本、内存统计、结果输出和本地桩LLM
+"""
+
+import json
+import os
+import platform
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# 合成文本使用的词汇，生成的内容近似中文课程讲义
+SUBJECTS = ['函数', '极限', '导数', '积分', '矩阵', '向量', '概率', '随机变量', '期望', '方差',
+            '线性方程组', '特征值', '数列', '级数', '微分方程', '集合', '映射', '图论', '算法', '复杂度']
+PREDICATES = ['的定义是', '可以用来描述', '与之密切相关的是', '的一个重要性质是', '通常通过以下方法求解：',
+              '在实际问题中常用于', '的推导依赖于', '可以推广到']
+OBJECTS = ['连续性', '单调性', '收敛性', '线性变换', '极值问题', '数值计算', '几何意义', '物理应用',
+           '逐项求导', '分部积分', '高斯消元', '归纳法', '反证法', '动态规划']
+
+def synthetic_text(rng: random.Random, target_chars: int) -> str:
+    """生成约target_chars个字符的讲义式文本，包含标题和段落"""
+    parts = []
+    length = 0
+    section = 1
+    while length < target_chars:
+        title = f"## 第{section}节 {rng.choice(SUBJECTS)}与{rng.choice(SUBJECTS)}"
+        sentences = [
+            f"{rng.choice(SUBJECTS)}{rng.choice(PREDICATES)}{rng.choice(OBJECTS)}。"
+            for _ in range(rng.randint(4, 10))
+        ]
+        paragraph = ''.join(sentences)
+        parts.extend([title, paragraph])
+        length += len(title) + len(paragraph)
+        section += 1
+    return '\n\n'.join(parts)
+
+_LATIN_WORD = re.compile(r'[A-Za-z0-9_]+')
+_CJK_CHAR = re.compile(r'[㐀-鿿豈-﫿]')
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计token数：每个汉字约一个token，英文按单词计"""
+    return len(_CJK_CHAR.findall(text)) + len(_LATIN_WORD.findall(text))
+
+def peak_rss_bytes():
+    """本进程及已结束子进程的峰值常驻内存（字节），无法获取时返回None"""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        # Windows上没有resource模块，psutil的peak_wset即峰值工作集
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss)
+    
+    # Linux下ru_maxrss单位为KB，macOS下为字节
+    scale = 1 if platform.system() == 'Darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return max(own, children)
+
+def environment_info() -> dict:
+    """记录运行环境，便于比较不同机器上的结果"""
+    return {
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'started_at': datetime.now().isoformat()
+    }
+
+def write_results(results: dict, output: str):
+    """以JSON输出结果，output为'-'时写到标准输出"""
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if output == '-':
+        print(text)
+        return
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        f.write(text)
+    print(f"📄 结果已写入 {output}")
+
+class StubLLM:
+    """进程内的桩LLM：替换OpenAI兼容SDK和智谱SDK的chat.completions.create
+
+    不发出网络请求，按设定的延迟返回固定内容，用于在没有API密钥时测量流程本身的开销。
+    星火通过websocket调用，无法在SDK层替换；基准测试应选择openai/silicon/chatglm作为服务商。
+    """
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, response_text: str = '', seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.response_text = response_text
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._originals = []
+    
+    def _respond(self, kwargs) -> dict:
+        prompt = ''.join(str(m.get('content', '')) for m in kwargs.get('messages', []) if isinstance(m, dict))
+        # 未指定返回内容时回显提示词末尾，保持返回长度与输入相关
+        content = self.response_text or prompt[-500:]
+        with self._lock:
+            delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            prompt_tokens = estimate_tokens(prompt)
+            completion_tokens = estimate_tokens(content)
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+        time.sleep(delay)
+        return {
+            'id': f'stub-{self.calls}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': kwargs.get('model') or 'stub',
+            'choices': [{
+                'index': 0,
+                'finish_reason': 'stop',
+                'message': {'role': 'assistant', 'content': content}
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens
+            }
+        }
+    
+    def install(self):
+        """替换已安装SDK的create方法，未安装的SDK跳过"""
+        import importlib
+        targets = [
+            ('openai.resources.chat.completions', 'Completions', 'openai.types.chat', 'ChatCompletion'),
+            ('zhipuai.api_resource.chat.completions', 'Completions', 'zhipuai.types.chat.chat_completion', 'Completion'),
+        ]
+        for module_name, class_name, type_module, type_name in targets:
+            try:
+                cls = getattr(importlib.import_module(module_name), class_name)
+                response_type = getattr(importlib.import_module(type_module), type_name)
+            except (ImportError, AttributeError):
+                continue
+            
+            def create(_self, *args, _response_type=response_type, **kwargs):
+                data = self._respond(kwargs)
+                if hasattr(_response_type, 'model_validate'):
+                    return _response_type.model_validate(data)
+                return _response_type.parse_obj(data)
+            
+            self._originals.append((cls, cls.create))
+            cls.create = create
+        return self
+    
+    def uninstall(self):
+        for cls, original in reversed(self._originals):
+            cls.create = original
+        self._originals.clear()
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'prompt_tokens': self.prompt_tokens,
+                'completion_tokens': self.completion_tokens
+            }
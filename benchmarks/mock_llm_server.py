@@ -0,0 +1,409 @@
+"""
+本地模拟的LLM/OCR服务，用于离线的性能测试和并发、重试相关的测试
+
+兼容SparkLearn客户端使用的接口：
+  - OpenAI兼容的 /v1/chat/completions（OpenAI、SiliconFlow，支持stream）
+  - 智谱的 /api/paas/v4/chat/completions
+  - 星火的websocket对话接口（如 ws://host:port/v3.5/chat）
+  - 讯飞通用文字识别 /v1/private/<服务ID>
+
+可以设置延迟分布、401/429/30011错误注入比例（与handle_api_error的分类对应）和令牌桶限流。
+
+    python -m benchmarks.mock_llm_server --port 8900 --latency lognormal:800,0.5 --error-429 0.05 --rate 20 --burst 40
+
+然后把客户端指向本服务，例如 OPENAI_BASE_URL=http://127.0.0.1:8900/v1、
+ZHIPUAI_BASE_URL=http://127.0.0.1:8900/api/paas/v4/；星火和OCR的地址在SparkLearn的config.py中修改。
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import math
+import random
+import struct
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.common import estimate_tokens
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+class LatencyModel:
+    """延迟分布（毫秒）：fixed:MS、uniform:MIN,MAX、normal:MEAN,STD、lognormal:MEDIAN,SIGMA、exp:MEAN"""
+    def __init__(self, spec: str, rng: random.Random, lock: threading.Lock):
+        kind, _, params = spec.partition(':')
+        self.kind = kind
+        self.params = [float(p) for p in params.split(',') if p]
+        expected = {'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2, 'exp': 1}
+        if expected.get(kind) != len(self.params):
+            raise ValueError(f"无效的延迟分布: {spec}")
+        self._rng = rng
+        self._lock = lock
+    
+    def sample(self) -> float:
+        """返回一次延迟（秒）"""
+        with self._lock:
+            if self.kind == 'fixed':
+                ms = self.params[0]
+            elif self.kind == 'uniform':
+                ms = self._rng.uniform(*self.params)
+            elif self.kind == 'normal':
+                ms = self._rng.gauss(*self.params)
+            elif self.kind == 'lognormal':
+                median, sigma = self.params
+                ms = self._rng.lognormvariate(math.log(median), sigma)
+            else:
+                ms = self._rng.expovariate(1 / self.params[0])
+        return max(0.0, ms) / 1000
+
+class TokenBucket:
+    """令牌桶：每秒补充rate个令牌，最多积累capacity个"""
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def try_acquire(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+class MockState:
+    """服务的配置、随机数、限流桶和统计，在所有请求线程间共享"""
+    def __init__(self, args):
+        self.args = args
+        self._lock = threading.Lock()
+        self._rng = random.Random(args.seed)
+        self.latency = LatencyModel(args.latency, self._rng, self._lock)
+        self.ocr_latency = LatencyModel(args.ocr_latency, self._rng, self._lock)
+        self.buckets = {}
+        self.stats = Counter()
+        self.response_text = ''
+        if args.response_file:
+            with open(args.response_file, 'r', encoding='utf-8') as f:
+                self.response_text = f.read()
+    
+    def count(self, api: str, outcome: str):
+        with self._lock:
+            self.stats[f"{api}:{outcome}"] += 1
+    
+    def admit(self, api_key: str):
+        """决定本次请求是否注入错误或被限流，返回'401'、'429'、'30011'或None"""
+        with self._lock:
+            roll = self._rng.random()
+        args = self.args
+        if roll < args.error_401:
+            return '401'
+        if roll < args.error_401 + args.error_429:
+            return '429'
+        if roll < args.error_401 + args.error_429 + args.error_30011:
+            return '30011'
+        
+        if args.rate > 0:
+            with self._lock:
+                bucket = self.buckets.get(api_key)
+                if bucket is None:
+                    bucket = self.buckets[api_key] = TokenBucket(args.rate, args.burst or args.rate)
+            if not bucket.try_acquire():
+                return '429'
+        return None
+    
+    def reply_for(self, prompt: str) -> str:
+        # 未指定返回内容时回显提示词末尾，保持返回长度与输入相关
+        return self.response_text or f"模拟回复：{prompt[-300:]}"
+
+# 与真实服务相近的错误响应，状态码和关键字能被handle_api_error正确分类
+CHAT_ERRORS = {
+    '401': (401, {'error': {'message': 'Incorrect API key provided (401 Unauthorized)',
+                            'type': 'invalid_request_error', 'code': 'invalid_api_key'}}),
+    '429': (429, {'error': {'message': 'Rate limit reached, please try again later',
+                            'type': 'rate_limit_error', 'code': 'rate_limit_exceeded'}}),
+    '30011': (403, {'code': 30011, 'message': 'The paid balance is insufficient. Please top up your account.',
+                    'data': None}),
+}
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state: MockState = None
+    
+    def log_message(self, format, *args):
+        if self.state.args.verbose:
+            super().log_message(format, *args)
+    
+    # ---------- 通用 ----------
+    
+    def _send_json(self, status: int, data: dict, headers: dict = None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _read_json(self) -> dict:
+        length = int(self.headers.get('Content-Length', 0))
+        raw = self.rfile.read(length) if length else b''
+        try:
+            return json.loads(raw or b'{}')
+        except ValueError:
+            return {}
+    
+    def _api_key(self) -> str:
+        auth = self.headers.get('Authorization', '')
+        return auth or parse_qs(urlparse(self.path).query).get('host', ['anonymous'])[0]
+    
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if self.headers.get('Upgrade', '').lower() == 'websocket':
+            return self._spark_chat()
+        if path == '/health':
+            return self._send_json(200, {'status': 'ok'})
+        if path == '/stats':
+            return self._send_json(200, dict(self.state.stats))
+        self._send_json(404, {'error': {'message': f'未知接口: {path}'}})
+    
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if path.endswith('/chat/completions'):
+            return self._chat_completions(path)
+        if path.startswith('/v1/private/'):
+            return self._ocr()
+        self._send_json(404, {'error': {'message': f'未知接口: {path}'}})
+    
+    # ---------- OpenAI兼容 / 智谱 ----------
+    
+    def _chat_completions(self, path: str):
+        api = 'zhipuai' if path.startswith('/api/paas/') else 'openai'
+        request = self._read_json()
+        error = self.state.admit(self._api_key())
+        if error:
+            self.state.count(api, error)
+            status, body = CHAT_ERRORS[error]
+            return self._send_json(status, body, {'Retry-After': '1'} if error == '429' else None)
+        
+        prompt = ''.join(str(m.get('content', '')) for m in request.get('messages', []) if isinstance(m, dict))
+        content = self.state.reply_for(prompt)
+        prompt_tokens, completion_tokens = estimate_tokens(prompt), estimate_tokens(content)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        model = request.get('model') or 'mock'
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                 'total_tokens': prompt_tokens + completion_tokens}
+        
+        time.sleep(self.state.latency.sample())
+        self.state.count(api, 'ok')
+        if not request.get('stream'):
+            return self._send_json(200, {
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': content}}],
+                'usage': usage
+            })
+        
+        # 流式：首个token的延迟已在上面等待，之后按chunk间隔逐段发送
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        chunks = [content[i:i + self.state.args.chunk_chars] for i in range(0, len(content), self.state.args.chunk_chars)]
+        for i, chunk in enumerate(chunks):
+            event = {
+                'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': chunk},
+                             'finish_reason': 'stop' if i == len(chunks) - 1 else None}]
+            }
+            if i == len(chunks) - 1:
+                event['usage'] = usage
+            self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+            time.sleep(self.state.args.chunk_interval_ms / 1000)
+        self.wfile.write(b"data: [DONE]\n\n")
+    
+    # ---------- 讯飞OCR ----------
+    
+    def _ocr(self):
+        self._read_json()
+        sid = uuid.uuid4().hex
+        error = self.state.admit(self._api_key())
+        if error in ('401', '429'):
+            self.state.count('ocr', error)
+            status = int(error)
+            message = 'HMAC signature cannot be verified (401)' if error == '401' else 'Too Many Requests (429)'
+            return self._send_json(status, {'message': message})
+        if error == '30011':
+            self.state.count('ocr', error)
+            return self._send_json(200, {'header': {'code': 30011, 'message': 'paid balance insufficient', 'sid': sid}})
+        
+        time.sleep(self.state.ocr_latency.sample())
+        self.state.count('ocr', 'ok')
+        lines = [{'words': [{'content': line}]} for line in self.state.args.ocr_text.split('\\n')]
+        text = json.dumps({'pages': [{'lines': lines}]}, ensure_ascii=False)
+        self._send_json(200, {
+            'header': {'code': 0, 'message': 'success', 'sid': sid},
+            'payload': {'result': {
+                'compress': 'raw', 'encoding': 'utf8', 'format': 'json', 'status': 3,
+                'text': base64.b64encode(text.encode('utf-8')).decode('ascii')
+            }}
+        })
+    
+    # ---------- 星火websocket ----------
+    
+    def _ws_recv(self) -> str:
+        """读取一条文本消息（处理掩码和分片），连接关闭时返回None"""
+        message = b''
+        while True:
+            header = self.rfile.read(2)
+            if len(header) < 2:
+                return None
+            fin, opcode = header[0] & 0x80, header[0] & 0x0F
+            length = header[1] & 0x7F
+            if length == 126:
+                length = struct.unpack('!H', self.rfile.read(2))[0]
+            elif length == 127:
+                length = struct.unpack('!Q', self.rfile.read(8))[0]
+            mask = self.rfile.read(4) if header[1] & 0x80 else b''
+            payload = self.rfile.read(length)
+            if mask:
+                payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+            if opcode == 0x8:
+                return None
+            if opcode in (0x9, 0xA):
+                continue
+            message += payload
+            if fin:
+                return message.decode('utf-8')
+    
+    def _ws_send(self, data, opcode=0x1):
+        payload = json.dumps(data, ensure_ascii=False).encode('utf-8') if opcode == 0x1 else data
+        header = bytes([0x80 | opcode])
+        if len(payload) < 126:
+            header += bytes([len(payload)])
+        elif len(payload) < 1 << 16:
+            header += bytes([126]) + struct.pack('!H', len(payload))
+        else:
+            header += bytes([127]) + struct.pack('!Q', len(payload))
+        self.wfile.write(header + payload)
+        self.wfile.flush()
+    
+    def _spark_chat(self):
+        self.close_connection = True
+        error = self.state.admit(self._api_key())
+        if error in ('401', '429'):
+            # 星火的鉴权和限流错误在握手阶段以HTTP状态码返回
+            self.state.count('spark', error)
+            message = 'HMAC signature does not match (401)' if error == '401' else 'Too Many Requests (429)'
+            return self._send_json(int(error), {'message': message})
+        
+        key = self.headers.get('Sec-WebSocket-Key', '')
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode('ascii')).digest()).decode('ascii')
+        self.send_response(101, 'Switching Protocols')
+        self.send_header('Upgrade', 'websocket')
+        self.send_header('Connection', 'Upgrade')
+        self.send_header('Sec-WebSocket-Accept', accept)
+        self.end_headers()
+        
+        raw = self._ws_recv()
+        if raw is None:
+            return
+        try:
+            request = json.loads(raw)
+        except ValueError:
+            request = {}
+        sid = f"cht{uuid.uuid4().hex[:20]}"
+        if error == '30011':
+            self.state.count('spark', error)
+            self._ws_send({'header': {'code': 30011, 'message': 'paid balance insufficient', 'sid': sid, 'status': 2}})
+            self._ws_send(struct.pack('!H', 1000), opcode=0x8)
+            return
+        
+        texts = request.get('payload', {}).get('message', {}).get('text', [])
+        prompt = ''.join(str(t.get('content', '')) for t in texts if isinstance(t, dict))
+        content = self.state.reply_for(prompt)
+        chunk_chars = self.state.args.chunk_chars
+        chunks = [content[i:i + chunk_chars] for i in range(0, len(content), chunk_chars)] or ['']
+        
+        time.sleep(self.state.latency.sample())
+        for seq, chunk in enumerate(chunks):
+            status = 2 if seq == len(chunks) - 1 else (0 if seq == 0 else 1)
+            frame = {
+                'header': {'code': 0, 'message': 'Success', 'sid': sid, 'status': status},
+                'payload': {'choices': {'status': status, 'seq': seq,
+                                        'text': [{'content': chunk, 'role': 'assistant', 'index': 0}]}}
+            }
+            if status == 2:
+                prompt_tokens, completion_tokens = estimate_tokens(prompt), estimate_tokens(content)
+                frame['payload']['usage'] = {'text': {
+                    'question_tokens': prompt_tokens, 'prompt_tokens': prompt_tokens,
+                    'completion_tokens': completion_tokens, 'total_tokens': prompt_tokens + completion_tokens
+                }}
+            self._ws_send(frame)
+            if status != 2:
+                time.sleep(self.state.args.chunk_interval_ms / 1000)
+        self.state.count('spark', 'ok')
+        self._ws_send(struct.pack('!H', 1000), opcode=0x8)
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟LLM/OCR服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', default='lognormal:800,0.4',
+                        help='对话接口的延迟分布（毫秒）：fixed:MS、uniform:MIN,MAX、normal:MEAN,STD、'
+                             'lognormal:MEDIAN,SIGMA、exp:MEAN')
+    parser.add_argument('--ocr-latency', default='lognormal:500,0.3', help='OCR接口的延迟分布（毫秒）')
+    parser.add_argument('--chunk-chars', type=int, default=20, help='流式返回时每段的字符数')
+    parser.add_argument('--chunk-interval-ms', type=float, default=30, help='流式返回的段间隔')
+    parser.add_argument('--error-401', type=float, default=0.0, help='返回认证错误的比例')
+    parser.add_argument('--error-429', type=float, default=0.0, help='返回限流错误的比例（不含令牌桶限流）')
+    parser.add_argument('--error-30011', type=float, default=0.0, help='返回余额不足错误的比例')
+    parser.add_argument('--rate', type=float, default=0.0, help='每个API密钥每秒允许的请求数，0表示不限流')
+    parser.add_argument('--burst', type=float, default=0.0, help='令牌桶容量，默认等于rate')
+    parser.add_argument('--response-file', help='对话接口返回内容所在的文件，默认回显提示词末尾')
+    parser.add_argument('--ocr-text', default='模拟识别结果\\n第二行文字', help='OCR返回的文字，\\n分行')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--verbose', action='store_true', help='打印每个请求')
+    args = parser.parse_args()
+    
+    if args.error_401 + args.error_429 + args.error_30011 > 1:
+        parser.error('错误比例之和不能超过1')
+    try:
+        MockHandler.state = MockState(args)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    server = ThreadingHTTPServer((args.host, args.port), MockHandler)
+    server.daemon_threads = True
+    base = f"http://{args.host}:{args.port}"
+    print(f"🧪 模拟LLM/OCR服务已启动: {base}")
+    print(f"   OpenAI/SiliconFlow: {base}/v1")
+    print(f"   智谱:               {base}/api/paas/v4/")
+    print(f"   星火websocket:      ws://{args.host}:{args.port}/v3.5/chat")
+    print(f"   讯飞OCR:            {base}/v1/private/<服务ID>")
+    print(f"   统计:               {base}/stats")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"统计: {dict(MockHandler.state.stats)}")
+
+if __name__ == '__main__':
+    main()
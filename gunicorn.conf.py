@@ -0,0 +1,33 @@
+"""
+SparkLearn-WebUI 后端的gunicorn配置
+各项均可通过环境变量覆盖，例如 WEB_THREADS=32 python wsgi.py
+"""
+
+import os
+
+# 以本目录为工作目录，与 python backend_server.py 的相对路径行为一致
+chdir = os.path.dirname(os.path.abspath(__file__))
+bind = f"{os.environ.get('BACKEND_HOST', '0.0.0.0')}:{os.environ.get('BACKEND_PORT', '5001')}"
+
+# 每个worker内部用线程处理请求；SSE进度订阅会一直占用一个线程
+worker_class = 'gthread'
+# 任务队列、进度通道和各类缓存都在worker进程内存中，
+# 多个worker时同一任务的提交与查询可能落到不同进程，需在前面配置按客户端粘滞的负载均衡
+workers = int(os.environ.get('WEB_WORKERS', '1'))
+threads = int(os.environ.get('WEB_THREADS', '16'))
+
+# gthread的timeout是worker心跳超时，不限制单个请求（长时间的SSE连接不受影响）
+timeout = int(os.environ.get('WEB_TIMEOUT', '120'))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.environ.get('WEB_KEEPALIVE', '5'))
+
+# 处理一定数量的请求后回收worker，0表示不回收。
+# 回收会丢弃该worker中排队和运行中的流程任务，只建议在不跑流程的部署中开启
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.environ.get('WEB_MAX_REQUESTS_JITTER', '0'))
+
+# 每个worker各自导入应用并加载一次配置，后台线程和进程池在worker中创建
+preload_app = False
+
+accesslog = os.environ.get('WEB_ACCESS_LOG', '-')
+loglevel = os.environ.get('WEB_LOG_LEVEL', 'info')
@@ -10,7 +10,15 @@ import time
 import os
 import signal
 import socket
+import threading
 import platform
+import json
+import hashlib
+import site
+import importlib.util
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional, Tuple
 
@@ -266,10 +274,57 @@ def handle_environment_setup():
         else:
             print("请输入 1、2、3 或 4")
 
+# 依赖包名与导入模块名不同的映射
+PACKAGE_MODULES = {
+    'flask_cors': 'flask_cors',
+    'opencv-python': 'cv2',
+    'PyMuPDF': 'fitz',
+    'pillow': 'PIL',
+    'python-pptx': 'pptx',
+    'websocket-client': 'websocket',
+}
+DEPENDENCY_CACHE_FILE = Path(__file__).parent / ".cache" / "python_deps.json"
+
+def is_package_installed(package: str) -> bool:
+    """只查找模块位置，不执行模块代码"""
+    module_name = PACKAGE_MODULES.get(package, package)
+    try:
+        return importlib.util.find_spec(module_name) is not None
+    except (ImportError, ValueError):
+        return False
+
+def dependency_cache_key() -> str:
+    """解释器路径、requirements.txt内容和site-packages目录的mtime共同决定缓存是否有效
+
+    pip安装或卸载包会修改site-packages目录，从而使缓存失效。
+    """
+    digest = hashlib.sha256()
+    digest.update(sys.executable.encode("utf-8"))
+    requirements = Path(__file__).parent / "requirements.txt"
+    if requirements.exists():
+        digest.update(requirements.read_bytes())
+    site_dirs = site.getsitepackages() if hasattr(site, "getsitepackages") else []
+    for site_dir in site_dirs + [site.getusersitepackages()]:
+        try:
+            digest.update(f"{site_dir}:{os.stat(site_dir).st_mtime_ns}".encode("utf-8"))
+        except OSError:
+            continue
+    return digest.hexdigest()
+
 def check_python_dependencies():
     """检查Python依赖状态"""
     print("🔍 检查Python依赖...")
     
+    # 环境未变化且上次检查全部通过时直接跳过
+    cache_key = dependency_cache_key()
+    try:
+        with open(DEPENDENCY_CACHE_FILE, "r", encoding="utf-8") as f:
+            if json.load(f).get("key") == cache_key:
+                print("✅ Python依赖未变化，跳过检查")
+                return [], []
+    except (OSError, ValueError):
+        pass
+    
     # 核心依赖包
     core_packages = ['flask', 'flask_cors', 'requests', 'networkx']
     # 可选依赖包
@@ -279,52 +334,8 @@ def check_python_dependencies():
         'zhipuai', 'chardet', 'matplotlib', 'websocket-client'
     ]
     
-    missing_core = []
-    missing_optional = []
-    
-    # 检查核心依赖
-    for package in core_packages:
-        try:
-            if package == 'flask_cors':
-                import flask_cors
-            else:
-                __import__(package)
-        except ImportError:
-            missing_core.append(package)
-    
-    # 检查可选依赖
-    for package in optional_packages:
-        try:
-            if package == 'flask_cors':
-                import flask_cors
-            elif package == 'opencv-python':
-                import cv2
-            elif package == 'PyMuPDF':
-                import fitz
-            elif package == 'html2text':
-                import html2text
-            elif package == 'pdf2image':
-                import pdf2image
-            elif package == 'pillow':
-                import PIL
-            elif package == 'python-pptx':
-                import pptx
-            elif package == 'PyPDF2':
-                import PyPDF2
-            elif package == 'networkx':
-                import networkx
-            elif package == 'zhipuai':
-                import zhipuai
-            elif package == 'chardet':
-                import chardet
-            elif package == 'matplotlib':
-                import matplotlib
-            elif package == 'websocket-client':
-                import websocket
-            else:
-                __import__(package)
-        except ImportError:
-            missing_optional.append(package)
+    missing_core = [package for package in core_packages if not is_package_installed(package)]
+    missing_optional = [package for package in optional_packages if not is_package_installed(package)]
     
     # 显示检查结果
     if missing_core:
@@ -337,6 +348,15 @@ def check_python_dependencies():
     else:
         print("✅ 可选依赖已安装")
     
+    # 只缓存全部通过的结果，缺少依赖时下次启动仍会重新检查
+    if not missing_core and not missing_optional:
+        try:
+            DEPENDENCY_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+            with open(DEPENDENCY_CACHE_FILE, "w", encoding="utf-8") as f:
+                json.dump({"key": cache_key}, f)
+        except OSError:
+            pass
+    
     return missing_core, missing_optional
 
 def check_node_dependencies():
@@ -549,8 +569,53 @@ def handle_dependencies():
     
     return True
 
-def start_backend():
-    """启动后端服务器"""
+# 就绪探测地址与最长等待时间
+BACKEND_HEALTH_URL = "http://localhost:5001/api/health"
+FRONTEND_URL = "http://localhost:3000/"
+READY_TIMEOUT = float(os.environ.get("STARTUP_READY_TIMEOUT", "120"))
+
+def wait_until_ready(name: str, process: subprocess.Popen, url: str, log_path: Path,
+                     timeout: float = READY_TIMEOUT, cancelled: Optional[threading.Event] = None) -> Optional[float]:
+    """轮询url直到服务可以响应，间隔按指数退避增长；返回就绪耗时（秒），失败或取消时返回None"""
+    start = time.monotonic()
+    delay = 0.1
+    while time.monotonic() - start < timeout:
+        if cancelled is not None and cancelled.is_set():
+            return None
+        if process.poll() is not None:
+            print(f"❌ {name}启动失败（进程已退出，退出码 {process.returncode}）")
+            show_log_tail(log_path)
+            return None
+        try:
+            with urllib.request.urlopen(url, timeout=2) as response:
+                if response.status < 500:
+                    return time.monotonic() - start
+        except urllib.error.HTTPError as e:
+            # 能返回HTTP错误说明服务已经在监听
+            if e.code < 500:
+                return time.monotonic() - start
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(delay)
+        delay = min(delay * 2, 2.0)
+    
+    print(f"❌ {name}在{timeout:.0f}秒内未就绪")
+    show_log_tail(log_path)
+    return None
+
+def show_log_tail(log_path: Path, lines: int = 20):
+    """显示日志文件末尾几行，便于排查启动失败"""
+    try:
+        with open(log_path, "r", encoding="utf-8", errors="replace") as f:
+            tail = f.readlines()[-lines:]
+    except OSError:
+        return
+    if tail:
+        print(f"错误信息（{log_path.name}）:")
+        print("".join(tail).rstrip())
+
+def start_backend() -> Optional[subprocess.Popen]:
+    """启动后端服务器进程（不等待就绪）"""
     global backend_process
     
     print("🚀 启动后端服务器...")
@@ -575,27 +640,14 @@ def start_backend():
             stdout=log_file,
             stderr=log_file,
             text=True)
-        
-        # 等待后端启动
-        print("⏳ 等待后端服务器启动...")
-        time.sleep(5)
-        
-        if backend_process.poll() is None:
-            print("✅ 后端服务器已启动 (http://localhost:5001)")
-            return backend_process
-        else:
-            stdout, stderr = backend_process.communicate()
-            print(f"❌ 后端服务器启动失败")
-            if stderr:
-                print(f"错误信息: {stderr}")
-            return None
+        return backend_process
             
     except Exception as e:
         print(f"❌ 启动后端服务器时出错: {e}")
         return None
 
-def start_frontend():
-    """启动前端开发服务器"""
+def start_frontend() -> Optional[subprocess.Popen]:
+    """启动前端开发服务器进程（不等待就绪）"""
     global frontend_process
     
     print("🎨 启动前端开发服务器...")
@@ -619,31 +671,74 @@ def start_frontend():
         npm_bin = "npm"
 
     try:
-        frontend_process = subprocess.Popen(
-            [npm_bin, "run", "dev"],
-            cwd=web_dir,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-
-        print("⏳ 等待前端服务器启动...")
-        time.sleep(8)  # 前端启动需要更长时间
-
-        if frontend_process.poll() is None:
-            print("✅ 前端服务器已启动 (http://localhost:3000)")
-            return frontend_process
-        else:
-            stdout, stderr = frontend_process.communicate()
-            print("❌ 前端服务器启动失败")
-            if stderr:
-                print(f"错误信息: {stderr}")
-            return None
+        # 输出写入日志文件，避免管道写满后阻塞前端进程
+        with open("frontend.log", "w", buffering=1) as log_file:
+            frontend_process = subprocess.Popen(
+                [npm_bin, "run", "dev"],
+                cwd=web_dir,
+                stdout=log_file,
+                stderr=log_file,
+                text=True
+            )
+        return frontend_process
             
     except Exception as e:
         print(f"❌ 启动前端服务器时出错: {e}")
         return None
 
+def start_services() -> Tuple[Optional[subprocess.Popen], Optional[subprocess.Popen]]:
+    """同时启动前后端并并行探测就绪，总耗时取决于较慢的一方"""
+    global backend_process, frontend_process
+    
+    start = time.monotonic()
+    backend = start_backend()
+    if not backend:
+        return None, None
+    frontend = start_frontend()
+    
+    print("⏳ 等待服务就绪...")
+    log_dir = Path.cwd()
+    cancelled = threading.Event()
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        backend_ready = pool.submit(wait_until_ready, "后端服务器", backend, BACKEND_HEALTH_URL,
+                                    log_dir / "backend.log", cancelled=cancelled)
+        frontend_ready = pool.submit(wait_until_ready, "前端服务器", frontend, FRONTEND_URL,
+                                     log_dir / "frontend.log", cancelled=cancelled) if frontend else None
+        
+        backend_seconds = backend_ready.result()
+        if backend_seconds is None:
+            # 后端失败时不再等待前端；后端进程可能仍在运行并占用端口，先终止再丢弃引用
+            cancelled.set()
+            stop_process(backend, "后端服务器")
+            backend_process = None
+            return None, frontend
+        print(f"✅ 后端服务器已就绪 (http://localhost:5001)，耗时 {backend_seconds:.1f} 秒")
+        
+        if frontend_ready is not None:
+            frontend_seconds = frontend_ready.result()
+            if frontend_seconds is None:
+                # 未就绪的前端进程可能仍占用端口，先终止再丢弃引用
+                stop_process(frontend, "前端服务器")
+                frontend = None
+                frontend_process = None
+            else:
+                print(f"✅ 前端服务器已就绪 (http://localhost:3000)，耗时 {frontend_seconds:.1f} 秒")
+    
+    print(f"⏱️  服务全部就绪共耗时 {time.monotonic() - start:.1f} 秒")
+    return backend, frontend
+
+def stop_process(process: subprocess.Popen, name: str):
+    """终止进程，5秒内没有退出则强制结束"""
+    try:
+        process.terminate()
+        process.wait(timeout=5)
+        print(f"✅ {name}已停止")
+    except subprocess.TimeoutExpired:
+        process.kill()
+        print(f"⚠️  强制停止{name}")
+    except Exception as e:
+        print(f"⚠️  停止{name}时出错: {e}")
+
 def cleanup_processes():
     """清理所有进程"""
     global backend_process, frontend_process
@@ -651,26 +746,10 @@ def cleanup_processes():
     print("🛑 正在停止服务...")
     
     if backend_process:
-        try:
-            backend_process.terminate()
-            backend_process.wait(timeout=5)
-            print("✅ 后端服务器已停止")
-        except subprocess.TimeoutExpired:
-            backend_process.kill()
-            print("⚠️  强制停止后端服务器")
-        except Exception as e:
-            print(f"⚠️  停止后端服务器时出错: {e}")
+        stop_process(backend_process, "后端服务器")
     
     if frontend_process:
-        try:
-            frontend_process.terminate()
-            frontend_process.wait(timeout=5)
-            print("✅ 前端服务器已停止")
-        except subprocess.TimeoutExpired:
-            frontend_process.kill()
-            print("⚠️  强制停止前端服务器")
-        except Exception as e:
-            print(f"⚠️  停止前端服务器时出错: {e}")
+        stop_process(frontend_process, "前端服务器")
 
 def signal_handler(signum, frame):
     """信号处理器"""
@@ -701,17 +780,15 @@ def main():
     print("\n🎉 环境配置完成！正在启动服务...")
     print("=" * 50)
     
-    # 启动后端
-    backend_process = start_backend()
+    # 同时启动前后端
+    backend_process, frontend_process = start_services()
     if not backend_process:
         print("\n❌ 后端启动失败")
+        cleanup_processes()
         sys.exit(1)
     
-    # 启动前端
-    frontend_process = start_frontend()
     if not frontend_process:
         print("⚠️  前端启动失败，但后端已成功启动")
-        frontend_process = None
     
     print("\n🎉 启动完成！")
     print("🔧 后端: http://localhost:5001")
@@ -28,6 +28,8 @@ export default function KgQaPage() {
   const [hoveredLink, setHoveredLink] = useState(null);
   const [generating, setGenerating] = useState(false);
   const [savedPath, setSavedPath] = useState('');
+  const [qaProgress, setQaProgress] = useState({ completed: 0, total: 0 });
+  const [graphHasLayout, setGraphHasLayout] = useState(false);
   const handleLinkHover = (link, prevLink) => {
     setHoveredLink(link);
   };
@@ -45,6 +47,8 @@ export default function KgQaPage() {
       });
       
       if (result.success) {
+        // 后端已计算好节点坐标时不再运行力导向模拟，直接绘制
+        setGraphHasLayout(!!result.has_layout);
         setGraphData(result.data);
         setHasLoaded(true);
         const graphPath = path.join(s.outputPath, 'tree','graph');
@@ -101,6 +105,8 @@ export default function KgQaPage() {
   }, [fgRef.current, dimensions]);
 
   const updatePhysicsParam = (key, value) => {
+    // 用户调整物理参数后恢复力导向模拟
+    setGraphHasLayout(false);
     setPhysicsConfig(prev => ({
       ...prev,
       [key]: value
@@ -237,15 +243,29 @@ export default function KgQaPage() {
 
     try {
       const concepts = selectedNodes.map(node => node.name);
+      setQaProgress({ completed: 0, total: concepts.length });
+      const failures = [];
       const result = await invoke('generateQA', {
         graphPath: s.graphPath,
         concepts,
         difficulty: new FormData(e.target).get('difficulty'),
         output: s.outputPath,
+        onItem: (item) => {
+          if (item.type === 'question') {
+            setQaProgress({ completed: item.completed, total: item.total });
+          } else if (item.type === 'error') {
+            failures.push(`${item.concept}: ${item.error}`);
+          }
+        },
       });
 
       if (result.success) {
         setSavedPath(path.join(s.outputPath, 'QA'));
+        if (failures.length > 0) {
+          setError(`部分概念生成失败：${failures.join('；')}`);
+        }
+      } else if (failures.length > 0) {
+        setError(failures.join('；'));
       } else {
         setError(result.error || '生成题目失败');
       }
@@ -436,7 +456,7 @@ export default function KgQaPage() {
             nodeVal="val"
             nodeLabel={null}
             linkLabel={null}
-            cooldownTicks={Infinity}
+            cooldownTicks={graphHasLayout ? 0 : Infinity}
             nodePointerAreaPaint={null}
             onNodeClick={handleNodeClick}
             linkPointerAreaPaint={null}
@@ -557,7 +577,7 @@ export default function KgQaPage() {
             className={`btn w-full ${selectedNodes.length === 0 || generating ? 'opacity-50 cursor-not-allowed' : ''}`}
             disabled={selectedNodes.length === 0 || generating}
           >
-            {generating ? '正在生成题目...' : '生成题目'}
+            {generating ? `正在生成题目 (${qaProgress.completed}/${qaProgress.total})...` : '生成题目'}
           </button>
 
           {savedPath && (
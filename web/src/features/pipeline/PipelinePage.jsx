@@ -297,47 +297,22 @@ export default function PipelinePage() {
     addLog('开始处理...', 'info');
     
     try {
-      // 实时获取后端进度更新
-      let progressInterval;
-      progressInterval = setInterval(async () => {
-        try {
-          const response = await fetch('http://localhost:5001/api/getProgress');
-          if (response.ok) {
-            const progress = await response.json();
-            if (progress.current_step) {
-              dispatch({ type: 'setProgress', payload: { 
-                percentage: progress.percentage, 
-                currentStep: progress.current_step,
-                estimatedTime: progress.message || ''
-              }});
-              
-              // 检查是否失败或完成
-              if (progress.current_step.includes('❌') || progress.current_step.includes('失败') || 
-                  progress.current_step.includes('✅ 全部流程完成')) {
-                clearInterval(progressInterval);
-                if (progress.current_step.includes('❌') || progress.current_step.includes('失败')) {
-                  throw new Error(progress.current_step);
-                }
-              }
-            }
-          }
-        } catch (error) {
-          console.warn('获取进度失败:', error);
-          clearInterval(progressInterval);
-        }
-      }, 3000); // 改为3秒间隔，减少日志噪音
-
-      // 启动后端处理
-      const pipelinePromise = invoke('runPipeline', {
+      // 启动后端处理，进度由后端通过SSE推送
+      await invoke('runPipeline', {
         input_path: s.inputPath,
         output_path: s.outputPath,
         steps: Object.keys(steps).filter(k => steps[k]),
+        onProgress: (progress) => {
+          if (progress.current_step) {
+            dispatch({ type: 'setProgress', payload: { 
+              percentage: progress.percentage, 
+              currentStep: progress.current_step,
+              estimatedTime: progress.message || ''
+            }});
+          }
+        },
       });
       
-      // 等待处理完成
-      await pipelinePromise;
-      
-      clearInterval(progressInterval);
       dispatch({ type: 'setProgress', payload: { 
         percentage: 100, 
         currentStep: '✅ 处理完成', 
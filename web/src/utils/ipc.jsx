@@ -267,16 +267,52 @@ const augmentFile = async (params) => {
   }
 };
 
+// 逐行解析NDJSON响应，返回最后的done事件
+const readQAStream = async (response, onItem) => {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let done = { success: false, error: '问答生成中断' };
+
+  const handleLine = (line) => {
+    if (!line.trim()) return;
+    const event = JSON.parse(line);
+    if (event.type === 'done') {
+      done = event;
+    } else {
+      onItem(event);
+    }
+  };
+
+  while (true) {
+    const { value, done: finished } = await reader.read();
+    if (finished) break;
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split('\n');
+    buffer = lines.pop();
+    lines.forEach(handleLine);
+  }
+  handleLine(buffer);
+  return done;
+};
+
 // 生成问答对
+// 传入onItem时以流式方式生成，每完成一个概念回调一次
 const generateQA = async (params) => {
   try {
+    const { onItem, ...body } = params;
+    if (onItem) {
+      body.stream = true;
+    }
     const response = await fetch(`${BACKEND_URL}/api/generateQA`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify(params),
+      body: JSON.stringify(body),
     });
     
-    if (response.ok) {
+    if (response.ok && onItem) {
+      return await readQAStream(response, onItem);
+    } else if (response.ok) {
       const result = await response.json();
       return result;
     } else {
@@ -309,18 +345,52 @@ const buildKnowledgeGraph = async (params) => {
   }
 };
 
-// 运行处理流程
+// 运行处理流程：提交任务后通过SSE订阅任务进度，直到任务结束
+// params.onProgress(progress) 在每次进度变化时被调用
+const postJson = async (api, params) => {
+  const response = await fetch(`${BACKEND_URL}/api/${api}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(params),
+  });
+  const result = await response.json();
+  return { response, result };
+};
+
+const waitForJob = (jobId, onProgress) => new Promise((resolve, reject) => {
+  const source = new EventSource(`${BACKEND_URL}/api/jobEvents/${jobId}`);
+  source.addEventListener('progress', (event) => {
+    if (onProgress) {
+      onProgress(JSON.parse(event.data));
+    }
+  });
+  source.addEventListener('done', (event) => {
+    source.close();
+    resolve(JSON.parse(event.data));
+  });
+  source.onerror = () => {
+    // 连接断开且无法自动重连时才视为失败
+    if (source.readyState === EventSource.CLOSED) {
+      reject(new Error('任务进度连接已断开'));
+    }
+  };
+});
+
 const runPipeline = async (params) => {
   try {
-    const response = await fetch(`${BACKEND_URL}/api/runPipeline`, {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify(params),
-    });
-    
-    const result = await response.json();
-    
-    if (response.ok) {
+    const { onProgress, ...body } = params;
+    const { response, result: submitted } = await postJson('submitPipeline', body);
+    if (!response.ok) {
+      const error = new Error(submitted.error || '流程提交失败');
+      error.response = { data: submitted };
+      throw error;
+    }
+
+    const jobId = submitted.job_id;
+    await waitForJob(jobId, onProgress);
+
+    const { response: resultResponse, result } = await postJson('getJobResult', { job_id: jobId });
+    if (resultResponse.ok) {
       return result;
     } else {
       // 创建错误对象，包含后端返回的详细错误信息
@@ -400,20 +470,37 @@ const selectInput = async (params) => {
 };
 
 // 列出目录内容
-const listDirectory = async (params) => {
-  try {
+// 后端按页返回（默认每页500项）；调用方没有指定cursor或limit时，沿next_cursor取完所有页再返回
+const listDirectory = async (params = {}) => {
+  const fetchPage = async (pageParams) => {
     const response = await fetch(`${BACKEND_URL}/api/listDirectory`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify(params),
+      body: JSON.stringify(pageParams),
     });
-    
-    if (response.ok) {
-      const result = await response.json();
+    const result = await response.json().catch(() => null);
+    if (!response.ok || !result) {
+      throw new Error(result?.error || '目录列表获取失败');
+    }
+    return result;
+  };
+
+  try {
+    const result = await fetchPage(params);
+    if (params.cursor !== undefined || params.limit !== undefined || !result.success) {
       return result;
-    } else {
-      throw new Error('目录列表获取失败');
     }
+
+    const items = [...result.items];
+    let page = result;
+    while (page.has_more && page.next_cursor) {
+      page = await fetchPage({ ...params, cursor: page.next_cursor });
+      if (!page.success) {
+        return page;
+      }
+      items.push(...page.items);
+    }
+    return { ...result, items, has_more: false, next_cursor: null };
   } catch (error) {
     console.error('列出目录失败:', error);
     throw error;
@@ -440,6 +527,9 @@ const openFolder = async (params) => {
     throw error;
   }
 };
+// 按输出路径缓存图谱数据和ETag，图谱未变化时后端返回304，直接使用缓存
+const knowledgeGraphCache = new Map();
+
 const getKnowledgeGraph = async (params) => {
   try {
     // 如果是字符串，先包装成对象；如果是对象，确保 output_path 是正斜杠
@@ -449,14 +539,27 @@ const getKnowledgeGraph = async (params) => {
 
     // console.log('发送给后端的路径：', payload.output_path);
 
+    const cached = knowledgeGraphCache.get(payload.output_path);
+    const headers = { 'Content-Type': 'application/json' };
+    if (cached) {
+      headers['If-None-Match'] = cached.etag;
+    }
+
     const response = await fetch(`${BACKEND_URL}/api/getKnowledgeGraph`, {
       method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
+      headers,
       body: JSON.stringify(payload),
     });
 
+    if (response.status === 304 && cached) {
+      return cached.result;
+    }
     if (response.ok) {
       const result = await response.json();
+      const etag = response.headers.get('ETag');
+      if (etag) {
+        knowledgeGraphCache.set(payload.output_path, { etag, result });
+      }
       return result;
     } else {
       throw new Error('知识图谱获取请求失败');
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+SparkLearn-WebUI 后端生产环境入口
+
+    python wsgi.py                          # Linux/macOS使用gunicorn，Windows使用waitress
+    gunicorn -c gunicorn.conf.py wsgi:app   # 直接使用gunicorn
+
+与 python backend_server.py 不同，这里不开启调试模式和自动重载。
+"""
+
+import os
+import sys
+import platform
+from pathlib import Path
+
+def serve_with_gunicorn():
+    """按gunicorn.conf.py启动多worker、多线程服务"""
+    try:
+        from gunicorn.app.wsgiapp import run
+    except ImportError:
+        print("❌ 未安装gunicorn，请运行: pip install gunicorn")
+        sys.exit(1)
+    
+    config_file = Path(__file__).parent / 'gunicorn.conf.py'
+    sys.argv = [sys.argv[0], '-c', str(config_file), 'wsgi:app']
+    run()
+
+def serve_with_waitress():
+    """Windows下没有gunicorn，使用waitress的单进程多线程服务"""
+    try:
+        from waitress import serve
+    except ImportError:
+        print("❌ 未安装waitress，请运行: pip install waitress")
+        sys.exit(1)
+    
+    from backend_server import app, load_env_config
+    load_env_config()
+    
+    serve(
+        app,
+        host=os.environ.get('BACKEND_HOST', '0.0.0.0'),
+        port=int(os.environ.get('BACKEND_PORT', '5001')),
+        threads=int(os.environ.get('WEB_THREADS', '16')),
+        channel_timeout=int(os.environ.get('WEB_TIMEOUT', '120'))
+    )
+
+if __name__ == '__main__':
+    print("启动SparkLearn后端服务器（生产模式）...")
+    if platform.system() == 'Windows':
+        serve_with_waitress()
+    else:
+        serve_with_gunicorn()
+else:
+    # gunicorn的每个worker导入本模块时加载一次配置
+    from backend_server import app, load_env_config
+    load_env_config()